@@ -1,60 +1,9 @@
+import math
 import streamlit as st
-import asyncio
 from core import services as serv
-from utils import helpers as help
-
-st.set_page_config(page_title="Hostel Meal System", page_icon="🏠", layout="centered", initial_sidebar_state="collapsed")
-
-def load_css():
-    st.markdown("""
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap');
-            @import url('https://fonts.googleapis.com/icon?family=Material+Icons');
-            html, body, [class*="st-"], [class*="css-"] { font-family: 'Inter', sans-serif; }
-            .st-emotion-cache-1y4p8pa { padding-top: 2rem; }
-            
-            /* Fix for icon rendering issues */
-            .stButton > button {
-                font-family: 'Inter', sans-serif;
-            }
-            
-            /* Ensure emoji icons render properly */
-            .stMarkdown {
-                font-family: 'Inter', sans-serif;
-            }
-            
-            /* Sidebar styling */
-            .css-1d391kg {
-                font-family: 'Inter', sans-serif;
-            }
-            
-            /* Fix Material Icons in sidebar */
-            .material-icons {
-                font-family: 'Material Icons';
-                font-weight: normal;
-                font-style: normal;
-                font-size: 24px;
-                line-height: 1;
-                letter-spacing: normal;
-                text-transform: none;
-                display: inline-block;
-                white-space: nowrap;
-                word-wrap: normal;
-                direction: ltr;
-                -webkit-font-feature-settings: 'liga';
-                -webkit-font-smoothing: antialiased;
-            }
-            
-            /* Override any broken icon display */
-            [class*="css-"] .material-icons {
-                font-family: 'Material Icons' !important;
-            }
-        </style>
-    """, unsafe_allow_html=True)
-
-load_css()
-# Use the safe async runner
-help.run_async(serv.setup_database())
+from core import sessions
+from core.throttle import LoginThrottled
+from utils.bootstrap import bootstrap_page, run_async
 
 def register_hostel_page():
     st.title("Hostel Registration")
@@ -67,7 +16,7 @@ def register_hostel_page():
         if submitted:
             if all([hostel_name, admin_user_id, admin_password]):
                 with st.spinner("Registering..."):
-                    hostel_id = help.run_async(serv.register_hostel(hostel_name, admin_user_id, admin_password))
+                    hostel_id = run_async(serv.register_hostel(hostel_name, admin_user_id, admin_password))
                 if hostel_id:
                     st.session_state.page = 'registration_success'
                     st.session_state.new_hostel_id = hostel_id
@@ -89,7 +38,7 @@ def login_page():
         if st.button("Continue", use_container_width=True, type="primary"):
             if not hostel_id_input:
                 st.error("Hostel ID cannot be empty.")
-            elif help.run_async(serv.check_hostel_id_exists(hostel_id_input)):
+            elif run_async(serv.check_hostel_id_exists(hostel_id_input)):
                 st.session_state.hostel_id = hostel_id_input
                 st.rerun()
             else:
@@ -99,7 +48,7 @@ def login_page():
             st.rerun()
         return
 
-    hostel_name = help.run_async(serv.get_hostel_name(st.session_state.hostel_id))
+    hostel_name = run_async(serv.get_hostel_name(st.session_state.hostel_id))
     st.header(f"Step 2: Login to {hostel_name}")
     with st.form("login_form"):
         user_id = st.text_input("User ID")
@@ -109,15 +58,20 @@ def login_page():
             if not user_id or not password:
                 st.error("User ID and Password are required.")
             else:
-                role = help.run_async(serv.authenticate_user(st.session_state.hostel_id, user_id, password))
-                if role:
-                    st.session_state.logged_in = True
-                    st.session_state.user_id = user_id.upper()
-                    st.session_state.role = role
-                    st.toast(f"Welcome, {user_id}!", icon="👋")
-                    st.switch_page("pages/student_dashboard.py" if role == 'student' else "pages/admin_dashboard.py")
+                try:
+                    role = run_async(serv.authenticate_user(st.session_state.hostel_id, user_id, password))
+                except LoginThrottled as e:
+                    st.warning(f"Too many login attempts. Please try again in {math.ceil(e.retry_after)} seconds.")
                 else:
-                    st.error("Invalid credentials.")
+                    if role:
+                        st.session_state.logged_in = True
+                        st.session_state.user_id = user_id.upper()
+                        st.session_state.role = role
+                        st.session_state.session_token = sessions.create_session_token(st.session_state.hostel_id, user_id, role)
+                        st.toast(f"Welcome, {user_id}!", icon="👋")
+                        st.switch_page("pages/student_dashboard.py" if role == 'student' else "pages/admin_dashboard.py")
+                    else:
+                        st.error("Invalid credentials.")
     if st.button("← Use a different Hostel ID", use_container_width=True):
         del st.session_state.hostel_id
         st.rerun()
@@ -149,17 +103,23 @@ def registration_success_page():
         st.rerun()
 
 # --- Main App Router ---
-if 'logged_in' not in st.session_state:
-    st.session_state.logged_in = False
-if st.session_state.logged_in:
-    st.switch_page("pages/student_dashboard.py" if st.session_state.role == 'student' else "pages/admin_dashboard.py")
-else:
-    page = st.session_state.get('page', 'welcome')
-    if page == 'register':
-        register_hostel_page()
-    elif page == 'registration_success':
-        registration_success_page()
-    elif page == 'login':
-        login_page()
+def main():
+    if 'logged_in' not in st.session_state:
+        st.session_state.logged_in = False
+    if st.session_state.logged_in and not sessions.read_session_token(st.session_state.get('session_token')):
+        # The signed session expired or is invalid; require a fresh login.
+        st.session_state.logged_in = False
+    if st.session_state.logged_in:
+        st.switch_page("pages/student_dashboard.py" if st.session_state.role == 'student' else "pages/admin_dashboard.py")
     else:
-        welcome_page()
\ No newline at end of file
+        page = st.session_state.get('page', 'welcome')
+        if page == 'register':
+            register_hostel_page()
+        elif page == 'registration_success':
+            registration_success_page()
+        elif page == 'login':
+            login_page()
+        else:
+            welcome_page()
+
+bootstrap_page("app", "Hostel Meal System", "🏠", main, layout="centered", initial_sidebar_state="collapsed")
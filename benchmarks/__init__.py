@@ -0,0 +1 @@
+"""Synthetic-data benchmarks for the service layer; see benchmarks/run.py."""
@@ -0,0 +1,68 @@
+import random
+import sqlite3
+from datetime import date, timedelta
+from core.passes import MEAL_PREFIXES
+from utils import helpers as help
+
+BENCH_PASSWORD = "bench-password"
+BILL_ITEMS = ["Rice", "Wheat Flour", "Vegetables", "Milk", "Eggs", "Cooking Oil", "Lentils", "Gas Cylinder", "Spices", "Fruit"]
+MEALS = ("breakfast", "lunch", "dinner")
+MEAL_OPT_IN_RATES = {"breakfast": 0.6, "lunch": 0.85, "dinner": 0.8}
+
+def student_id(number):
+    return f"S{number:05d}"
+
+def generate(path, hostels=3, students=500, days=30, response_rate=0.8, attendance_rate=0.9, bills_per_day=3, seed=7):
+    """
+    Fills a migrated SQLite database with synthetic hostels: a roster per
+    hostel (all sharing one bcrypt hash), `days` of past meal_responses with
+    passes and attendance, matching daily_summary rows, and bills. Returns the
+    generated hostel IDs.
+    """
+    rng = random.Random(seed)
+    password_hash = help.hash_password(BENCH_PASSWORD)
+    today = date.today()
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = OFF")
+    hostel_ids = []
+    for h in range(hostels):
+        hostel_id = f"BNCH{h:04d}"
+        hostel_ids.append(hostel_id)
+        db.execute("INSERT INTO hostels (hostel_id, hostel_name) VALUES (?, ?)", [hostel_id, f"Benchmark Hostel {h}"])
+        db.execute("INSERT INTO users (hostel_id, user_id, password_hash, role, added_by) VALUES (?, 'ADMIN', ?, 'admin', 'SYSTEM')", [hostel_id, password_hash])
+        db.executemany(
+            "INSERT INTO users (hostel_id, user_id, password_hash, role, added_by) VALUES (?, ?, ?, 'student', 'BENCH')",
+            ((hostel_id, student_id(n), password_hash) for n in range(students))
+        )
+        for d in range(1, days + 1):
+            day = (today - timedelta(days=d)).isoformat()
+            responses, opt_ins = [], dict.fromkeys(MEALS, 0)
+            for n in range(students):
+                if rng.random() >= response_rate:
+                    continue
+                row = [hostel_id, student_id(n), day]
+                choices = [rng.random() < MEAL_OPT_IN_RATES[meal] for meal in MEALS]
+                row.extend(choices)
+                row.extend(f"{MEAL_PREFIXES[meal]}-{n:05d}" if chosen else None for meal, chosen in zip(MEALS, choices))
+                row.extend(chosen and rng.random() < attendance_rate for chosen in choices)
+                for meal, chosen in zip(MEALS, choices):
+                    opt_ins[meal] += chosen
+                responses.append(row)
+            db.executemany(
+                "INSERT INTO meal_responses (hostel_id, student_id, response_date, breakfast, lunch, dinner, breakfast_pass, lunch_pass, dinner_pass, "
+                "breakfast_attended, lunch_attended, dinner_attended) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                responses
+            )
+            unresponded = students - len(responses)
+            db.execute(
+                "INSERT INTO daily_summary (hostel_id, report_date, total_students, breakfast_opt_in, lunch_opt_in, dinner_opt_in, responded_students) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [hostel_id, day, students, opt_ins["breakfast"] + unresponded, opt_ins["lunch"] + unresponded, opt_ins["dinner"] + unresponded, len(responses)]
+            )
+            db.executemany(
+                "INSERT INTO bills (hostel_id, item_name, price, purchase_date) VALUES (?, ?, ?, ?)",
+                ((hostel_id, rng.choice(BILL_ITEMS), round(rng.uniform(50, 5000), 2), day) for _ in range(bills_per_day))
+            )
+        db.commit()
+    db.close()
+    return hostel_ids
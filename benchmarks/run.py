@@ -0,0 +1,162 @@
+"""
+Times every service function against a synthetic local SQLite database.
+
+    python -m benchmarks.run --hostels 50 --students 3000 --days 180 --output bench.json
+
+Results are printed (and optionally written) as JSON with throughput and
+p50/p95/p99 latencies per function, so runs can be diffed between releases.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from core import database
+from core import services as serv
+from core.sqlite_backend import LocalBackend
+from core.throttle import LoginThrottled
+from utils import helpers as help
+from . import datagen
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, ops_per_call=1):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "calls": len(latencies),
+        "ops_per_call": ops_per_call,
+        "total_seconds": round(total, 6),
+        "throughput_ops_per_s": round(len(latencies) * ops_per_call / total, 2) if total else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+async def timed(make_call, iterations, use_cache):
+    latencies = []
+    for i in range(iterations):
+        if not use_cache:
+            serv._cache.clear()
+        started = time.perf_counter()
+        await make_call(i)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+async def issued_passes(hostel_id, meal):
+    """Tomorrow's pass codes for one meal, for the verification benchmarks to present."""
+    async with database.get_db_connection(hostel_id) as conn:
+        rs = await conn.execute(f"SELECT {meal}_pass AS pass FROM meal_responses WHERE hostel_id = ? AND response_date = ? AND {meal}_pass IS NOT NULL",
+                                [hostel_id, (datetime.now() + timedelta(days=1)).date().isoformat()])
+    return [row['pass'] for row in rs.rows]
+
+async def run_benchmarks(hostel_ids, students, iterations, batch_size, use_cache, seed):
+    rng = random.Random(seed)
+    def any_hostel():
+        return rng.choice(hostel_ids)
+    def any_student():
+        return datagen.student_id(rng.randrange(students))
+    def any_choices():
+        return [rng.random() < 0.7 for _ in range(3)]
+
+    results = {}
+    async def bench(name, make_call, calls=iterations, ops_per_call=1):
+        results[name] = summarize(await timed(make_call, calls, use_cache), ops_per_call)
+
+    await bench("check_hostel_id_exists", lambda i: serv.check_hostel_id_exists(any_hostel()))
+    await bench("get_hostel_name", lambda i: serv.get_hostel_name(any_hostel()))
+    await bench("get_hostel_summary", lambda i: serv.get_hostel_summary(any_hostel()))
+    await bench("authenticate_user", lambda i: serv.authenticate_user(any_hostel(), any_student(), datagen.BENCH_PASSWORD), calls=min(iterations, 20))
+    async def stuff_credentials(i):
+        try:
+            await serv.authenticate_user(hostel_ids[0], datagen.student_id(0), "wrong-password")
+        except LoginThrottled:
+            pass
+    # After a few failures every guess is refused in memory, without a query or a hash.
+    await bench("authenticate_user_throttled", stuff_credentials)
+    await bench("submit_meal_response", lambda i: serv.submit_meal_response(any_hostel(), any_student(), *any_choices()))
+    await bench(
+        "submit_meal_responses",
+        lambda i: serv.submit_meal_responses(any_hostel(), [(any_student(), *any_choices()) for _ in range(batch_size)]),
+        calls=max(1, iterations // 10), ops_per_call=batch_size
+    )
+    await bench("get_student_meal_info", lambda i: serv.get_student_meal_info(any_hostel(), any_student()))
+    await bench("get_live_meal_counts", lambda i: serv.get_live_meal_counts(any_hostel()))
+    await bench("get_meal_event_version", lambda i: serv.get_meal_event_version(any_hostel()))
+    await bench("get_meal_forecast", lambda i: serv.get_meal_forecast(any_hostel()), calls=max(1, iterations // 10))
+    await bench("get_admin_dashboard_snapshot", lambda i: serv.get_admin_dashboard_snapshot(any_hostel()), calls=max(1, iterations // 10))
+    await bench("get_student_dashboard_snapshot", lambda i: serv.get_student_dashboard_snapshot(any_hostel(), any_student()))
+    # Report generation is once per hostel-day, so each hostel runs it once.
+    await bench("generate_daily_report_and_passes", lambda i: serv.generate_daily_report_and_passes(hostel_ids[i]), calls=len(hostel_ids))
+
+    pass_indexes = {hostel_id: await issued_passes(hostel_id, "lunch") for hostel_id in hostel_ids}
+    def any_pass(hostel_id):
+        codes = pass_indexes[hostel_id]
+        return codes.pop() if codes else "ZZZ"
+    async def verify_one(i):
+        hostel_id = any_hostel()
+        await serv.verify_meal_pass(hostel_id, "lunch", any_pass(hostel_id))
+    async def verify_batch(i):
+        hostel_id = any_hostel()
+        await serv.verify_meal_passes(hostel_id, "lunch", [any_pass(hostel_id) for _ in range(batch_size)])
+    await bench("verify_meal_pass", verify_one)
+    await bench("verify_meal_passes", verify_batch, calls=max(1, iterations // 10), ops_per_call=batch_size)
+    dinner_passes = {hostel_id: await issued_passes(hostel_id, "dinner") for hostel_id in hostel_ids}
+    async def verify_local(i):
+        hostel_id = any_hostel()
+        codes = dinner_passes[hostel_id]
+        await serv.verify_pass_locally(hostel_id, "dinner", codes.pop() if codes else "ZZZ")
+    await bench("verify_pass_locally", verify_local)
+    await bench("flush_attendance", lambda i: serv.flush_attendance(), calls=1)
+    await bench("refresh_meal_rollups", lambda i: serv.refresh_meal_rollups(hostel_ids[i]), calls=len(hostel_ids))
+    await bench("get_meal_history", lambda i: serv.get_meal_history(any_hostel(), "week"), calls=max(1, iterations // 10))
+    await bench("add_bill", lambda i: serv.add_bill(any_hostel(), "Benchmark Item", 100.0))
+    await bench("get_bills_page", lambda i: serv.get_bills_page(any_hostel()), calls=max(1, iterations // 10))
+    await bench("get_bill_totals", lambda i: serv.get_bill_totals(any_hostel()), calls=max(1, iterations // 10))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark core.services against a synthetic local database.")
+    parser.add_argument("--hostels", type=int, default=3)
+    parser.add_argument("--students", type=int, default=500, help="students per hostel")
+    parser.add_argument("--days", type=int, default=30, help="days of history per hostel")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per single-row function")
+    parser.add_argument("--batch-size", type=int, default=100, help="rows per bulk call")
+    parser.add_argument("--cache", action="store_true", help="keep the read-through cache warm instead of clearing it before each call")
+    parser.add_argument("--database", help="SQLite file to use; a temporary file by default")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    path = args.database or os.path.join(tempfile.mkdtemp(prefix="hostel-bench-"), "bench.db")
+    database.use_backend(LocalBackend(path))
+    help.run_async(serv.setup_database())
+
+    started = time.perf_counter()
+    hostel_ids = datagen.generate(path, hostels=args.hostels, students=args.students, days=args.days, seed=args.seed)
+    generation_seconds = time.perf_counter() - started
+
+    results = help.run_async(run_benchmarks(hostel_ids, args.students, args.iterations, args.batch_size, args.cache, args.seed))
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("database", "output")},
+        "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "platform": platform.platform()},
+        "dataset": {"database": path, "generation_seconds": round(generation_seconds, 3)},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
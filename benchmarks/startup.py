@@ -0,0 +1,118 @@
+"""
+Times cold start and reruns of app.py and both dashboard pages.
+
+    python -m benchmarks.startup --repeat 5 --reruns 20 --output startup.json
+
+Every sample runs in a fresh interpreter, so the first render pays for all
+imports, the database bootstrap and the render itself, as a newly started
+server does. Reruns are then timed in the same session. The report also
+lists which heavy dependencies each entry point loaded, since those
+dominate the cold start.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from core import database
+from core import services as serv
+from core import sessions
+from core.sqlite_backend import LocalBackend
+from utils import helpers as help
+from . import datagen
+from .run import percentile
+
+HEAVY_MODULES = ("numpy", "pandas", "pyarrow", "passlib", "bcrypt", "segno")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter. Streamlit itself is imported before the clock
+# starts; it is the same for every version of the app.
+_CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+script, state, reruns, heavy = json.loads(sys.argv[1])
+preloaded = set(sys.modules)
+at = AppTest.from_file(script, default_timeout=120)
+for key, value in state.items():
+    at.session_state[key] = value
+started = time.perf_counter()
+at.run()
+first = time.perf_counter() - started
+rerun_seconds = []
+for _ in range(reruns):
+    started = time.perf_counter()
+    at.run()
+    rerun_seconds.append(time.perf_counter() - started)
+print(json.dumps({
+    "first_render": first,
+    "reruns": rerun_seconds,
+    "modules_loaded": len(set(sys.modules) - preloaded),
+    "heavy_modules": [name for name in heavy if name in sys.modules and name not in preloaded],
+    "errors": [str(e.value) for e in at.exception],
+}))
+"""
+
+def _sample(script, state, reruns, env):
+    args = json.dumps([script, state, reruns, HEAVY_MODULES])
+    result = subprocess.run([sys.executable, "-c", _CHILD, args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+def measure(script, state, repeat, reruns, env):
+    samples = [_sample(script, state, reruns, env) for _ in range(repeat)]
+    first = sorted(sample["first_render"] for sample in samples)
+    rerun = sorted(seconds for sample in samples for seconds in sample["reruns"])
+    return {
+        "first_render_p50_ms": _ms(percentile(first, 50)),
+        "first_render_min_ms": _ms(first[0]),
+        "rerun_p50_ms": _ms(percentile(rerun, 50)) if rerun else None,
+        "rerun_p95_ms": _ms(percentile(rerun, 95)) if rerun else None,
+        "modules_loaded": samples[-1]["modules_loaded"],
+        "heavy_modules": samples[-1]["heavy_modules"],
+        "errors": samples[-1]["errors"],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time cold start and reruns of the Streamlit entry points.")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per entry point")
+    parser.add_argument("--reruns", type=int, default=20, help="reruns timed after each first render")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="hostel-startup-"), "startup.db")
+    database.use_backend(LocalBackend(path))
+    help.run_async(serv.setup_database())
+    hostel_id = datagen.generate(path, hostels=1, students=args.students, days=args.days)[0]
+
+    # Children share the database and the session secret, so tokens minted here are valid there.
+    env = {**os.environ, "DB_BACKEND": "sqlite", "SQLITE_PATH": path, "SESSION_SECRET": os.environ.get("SESSION_SECRET", "startup-benchmark"), "ARCHIVE_DIR": os.path.dirname(path)}
+    os.environ["SESSION_SECRET"] = env["SESSION_SECRET"]
+    def logged_in(user_id, role):
+        return {"logged_in": True, "hostel_id": hostel_id, "user_id": user_id, "role": role, "session_token": sessions.create_session_token(hostel_id, user_id, role)}
+
+    entry_points = {
+        "app": ("app.py", {}),
+        "student_dashboard": ("pages/student_dashboard.py", logged_in(datagen.student_id(0), "student")),
+        "admin_dashboard": ("pages/admin_dashboard.py", logged_in("ADMIN", "admin")),
+    }
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "results": {name: measure(script, state, args.repeat, args.reruns, env) for name, (script, state) in entry_points.items()},
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
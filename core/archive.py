@@ -0,0 +1,194 @@
+"""
+Compact per-hostel, per-month archives of old meal_responses rows.
+
+    python -m core.archive                     # archive months older than ARCHIVE_RETAIN_DAYS
+    python -m core.archive --retain-days 365
+
+One file per hostel-month, ARCHIVE_DIR/<hostel_id>/<YYYY-MM>.hma: the magic
+bytes, a little-endian u32 header length, a JSON header, then column blocks
+at the 8-byte aligned offsets the header lists. Rows are sorted by day and
+student. Numeric columns are stored raw so readers memory-map them without
+copying: `day` (uint8 day of month), `student` (an index into the sorted
+student dictionary) and the six meal and attendance booleans, bit-packed.
+Text columns (the dictionary, pass codes, submitted_at) are newline-joined
+and zlib-compressed.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import zlib
+from datetime import date
+import numpy as np
+import pandas as pd
+from .config import get_setting
+
+ARCHIVE_DIR = get_setting("ARCHIVE_DIR", "archives")
+MAGIC = b"HMA1"
+BOOL_COLUMNS = ("breakfast", "lunch", "dinner", "breakfast_attended", "lunch_attended", "dinner_attended")
+TEXT_COLUMNS = ("breakfast_pass", "lunch_pass", "dinner_pass", "submitted_at")
+# The order of values in the row tuples write_archive takes.
+COLUMNS = ("student_id", "response_date", *BOOL_COLUMNS, *TEXT_COLUMNS)
+_ALIGN = 8
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+def _pack_text(values):
+    return zlib.compress("\n".join("" if value is None else str(value) for value in values).encode(), 6)
+
+def _unpack_text(data, count):
+    if not count:
+        return []
+    return [value or None for value in zlib.decompress(data).decode().split("\n")]
+
+def archive_path(hostel_id, month, root=None):
+    return os.path.join(root or ARCHIVE_DIR, hostel_id.upper(), f"{month}.hma")
+
+def archived_months(hostel_id, root=None):
+    """The YYYY-MM months archived for a hostel, oldest first."""
+    directory = os.path.join(root or ARCHIVE_DIR, hostel_id.upper())
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-4] for name in os.listdir(directory) if name.endswith(".hma"))
+
+def totals(rows):
+    """Row count and per-column sums of the booleans, used to verify an archive against its source rows."""
+    sums = {"rows": len(rows)}
+    for i, name in enumerate(BOOL_COLUMNS, start=2):
+        sums[name] = sum(bool(row[i]) for row in rows)
+    return sums
+
+def write_archive(path, hostel_id, month, rows):
+    """
+    Writes `rows` (tuples in COLUMNS order, all within `month`) to `path`,
+    replacing any existing file atomically.
+    """
+    rows = sorted(rows, key=lambda row: (row[1], row[0]))
+    students = sorted({row[0] for row in rows})
+    index = {student: i for i, student in enumerate(students)}
+    student_dtype = np.dtype(np.uint16 if len(students) <= 1 << 16 else np.uint32)
+    blocks = {
+        "day": ("uint8", np.array([int(row[1][8:10]) for row in rows], dtype=np.uint8).tobytes()),
+        "student": (student_dtype.name, np.array([index[row[0]] for row in rows], dtype=student_dtype).tobytes()),
+        "students": ("text", _pack_text(students)),
+    }
+    for i, name in enumerate(BOOL_COLUMNS, start=2):
+        blocks[name] = ("bits", np.packbits(np.array([bool(row[i]) for row in rows], dtype=bool)).tobytes())
+    for i, name in enumerate(TEXT_COLUMNS, start=2 + len(BOOL_COLUMNS)):
+        blocks[name] = ("text", _pack_text(row[i] for row in rows))
+
+    columns, offset = {}, 0
+    for name, (encoding, data) in blocks.items():
+        columns[name] = {"encoding": encoding, "offset": offset, "length": len(data)}
+        offset = _aligned(offset + len(data))
+    header = json.dumps({"version": 1, "hostel_id": hostel_id.upper(), "month": month, "rows": len(rows), "students": len(students), "columns": columns}).encode()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        data_start = _aligned(f.tell())
+        for name, (_, data) in blocks.items():
+            f.write(b"\0" * (data_start + columns[name]["offset"] - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class ArchiveReader:
+    """
+    Memory-maps one archive file. Only the requested columns are touched, and
+    a day range is sliced from the sorted day column before anything is
+    unpacked. Arrays returned by column() are views that are valid until close().
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:4] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a meal response archive")
+        header_length, = struct.unpack_from("<I", self._mmap, 4)
+        self.header = json.loads(self._mmap[8:8 + header_length])
+        self.rows = self.header["rows"]
+        self._data_start = _aligned(8 + header_length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def _view(self, name):
+        spec = self.header["columns"][name]
+        start = self._data_start + spec["offset"]
+        return memoryview(self._mmap)[start:start + spec["length"]]
+
+    def column(self, name, start=0, stop=None):
+        """Rows [start, stop) of a column: numpy arrays for numbers and booleans, lists for text."""
+        stop = self.rows if stop is None else stop
+        encoding = self.header["columns"][name]["encoding"]
+        if encoding == "text":
+            values = _unpack_text(self._view(name), self.header["students"] if name == "students" else self.rows)
+            return values if name == "students" else values[start:stop]
+        if encoding == "bits":
+            first = start // 8
+            packed = np.frombuffer(self._view(name), dtype=np.uint8)[first:-(-stop // 8)]
+            return np.unpackbits(packed)[start - first * 8:stop - first * 8].astype(bool)
+        return np.frombuffer(self._view(name), dtype=encoding)[start:stop]
+
+    def to_frame(self, columns=COLUMNS, first_day=1, last_day=31):
+        """The archived rows for days first_day..last_day of the month as a DataFrame."""
+        days = self.column("day")
+        start, stop = np.searchsorted(days, first_day, "left"), np.searchsorted(days, last_day, "right")
+        frame = {}
+        for name in columns:
+            if name == "student_id":
+                frame[name] = np.array(self.column("students"), dtype=object)[self.column("student", start, stop)]
+            elif name == "response_date":
+                month = self.header["month"]
+                frame[name] = np.array([f"{month}-{day:02d}" for day in range(32)], dtype=object)[days[start:stop]]
+            elif name in TEXT_COLUMNS:
+                # An object Series keeps missing passes as None rather than NaN.
+                frame[name] = pd.Series(self.column(name, start, stop), dtype=object)
+            else:
+                frame[name] = self.column(name, start, stop)
+        return pd.DataFrame(frame, columns=list(columns))
+
+def read_month(hostel_id, month, start_date=None, end_date=None, columns=COLUMNS, root=None):
+    """One archived month, optionally clipped to an inclusive date range, or None if it is not archived."""
+    path = archive_path(hostel_id, month, root)
+    if not os.path.exists(path):
+        return None
+    first_day = start_date.day if start_date and f"{start_date:%Y-%m}" == month else 1
+    last_day = end_date.day if end_date and f"{end_date:%Y-%m}" == month else 31
+    with ArchiveReader(path) as reader:
+        return reader.to_frame(columns, first_day, last_day)
+
+def months_between(start_date, end_date):
+    """Every YYYY-MM from start_date's month through end_date's month."""
+    months, current = [], date(start_date.year, start_date.month, 1)
+    while current <= end_date:
+        months.append(f"{current:%Y-%m}")
+        current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+    return months
+
+def main(argv=None):
+    from . import services as serv
+    from utils import helpers as help
+    parser = argparse.ArgumentParser(description="Move old meal responses into per-hostel monthly archive files.")
+    parser.add_argument("--retain-days", type=int, default=serv.ARCHIVE_RETAIN_DAYS, help="days of responses kept in the live table")
+    parser.add_argument("--hostel", action="append", help="only archive these hostels (repeatable)")
+    args = parser.parse_args(argv)
+
+    help.run_async(serv.setup_database())
+    hostel_ids = args.hostel or help.run_async(serv.get_hostel_ids())
+    report = {hostel_id: help.run_async(serv.archive_meal_responses(hostel_id, args.retain_days)) for hostel_id in hostel_ids}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import threading
+
+class AttendanceBuffer:
+    """
+    Process-wide record of passes accepted at the counter, kept in memory so
+    verification never waits on the database. Each scope is a (hostel_id,
+    day, meal) tuple. Accepted students are queued and written to
+    meal_responses in batches by services.flush_attendance; a failed flush puts
+    them back for the next attempt.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._used = {}      # scope -> student IDs already admitted
+        self._pending = {}   # scope -> student IDs not yet written
+        self.stats = {"accepted": 0, "rejected": 0, "flushed": 0, "flush_failures": 0, "late_duplicates": 0}
+
+    def is_loaded(self, scope):
+        with self._lock:
+            return scope in self._used
+
+    def load(self, scope, student_ids):
+        """
+        Seeds a scope with students already marked in the database. Used sets
+        of earlier days are dropped, since their passes can no longer be
+        verified; their queued marks stay until flushed.
+        """
+        with self._lock:
+            for stale in [used_scope for used_scope in self._used if used_scope[1] < scope[1]]:
+                del self._used[stale]
+            self._used.setdefault(scope, set()).update(student_ids)
+
+    def claim(self, scope, student_id):
+        """Admits a student once per scope; False if they were already admitted."""
+        with self._lock:
+            used = self._used.setdefault(scope, set())
+            if student_id in used:
+                self.stats["rejected"] += 1
+                return False
+            used.add(student_id)
+            self._pending.setdefault(scope, set()).add(student_id)
+            self.stats["accepted"] += 1
+            return True
+
+    def reject(self):
+        with self._lock:
+            self.stats["rejected"] += 1
+
+    def drain(self):
+        """Takes every queued mark, as {scope: [student_id, ...]}."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return {scope: sorted(students) for scope, students in pending.items()}
+
+    def requeue(self, scope, student_ids):
+        with self._lock:
+            self._pending.setdefault(scope, set()).update(student_ids)
+            self.stats["flush_failures"] += 1
+
+    def record_flush(self, written, late_duplicates):
+        with self._lock:
+            self.stats["flushed"] += written
+            self.stats["late_duplicates"] += late_duplicates
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "pending": sum(len(students) for students in self._pending.values())}
@@ -0,0 +1,21 @@
+import os
+import streamlit as st
+
+def get_setting(name, default=None):
+    """
+    Reads a setting from Streamlit secrets, falling back to an environment
+    variable of the same name so background processes can run without secrets.toml.
+    """
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except FileNotFoundError:
+        pass
+    return os.environ.get(name, default)
+
+def get_flag(name, default=False):
+    """Reads a boolean setting; environment values like "1", "true" and "yes" count as enabled."""
+    value = get_setting(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
@@ -1,84 +1,269 @@
-import streamlit as st
+import json
+import time
 import libsql_client
 import asyncio
+import aiohttp
 from contextlib import asynccontextmanager
+from functools import partial
+from .config import get_setting
+from .cache import TTLCache, MISSING
+from . import metrics
 
-# --- Turso Database Connection ---
-@asynccontextmanager
-async def get_db_connection():
+# --- Turso Client Pool ---
+class ClientPool:
     """
-    Provides an asynchronous database connection to Turso.
-    This includes the final fix for the handshake error by using https.
+    A bounded pool of long-lived libSQL clients shared by every session.
+    Clients are bound to the event loop they were created on, so the pool must
+    only be used from coroutines submitted through utils.helpers.run_async.
     """
-    url = st.secrets["TURSO_DATABASE_URL"]
-    auth_token = st.secrets["TURSO_AUTH_TOKEN"]
-    
+    def __init__(self, factory, max_size=8, idle_timeout=300, health_check_interval=30):
+        self._factory = factory
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._health_check_interval = health_check_interval
+        self._idle = []  # (client, last_used) pairs, most recently used last
+        self._slots = asyncio.Semaphore(max_size)
+
+    async def acquire(self):
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                client, last_used = self._idle.pop()
+                idle_for = time.monotonic() - last_used
+                if client.closed or idle_for > self._idle_timeout:
+                    await self._discard(client)
+                elif idle_for > self._health_check_interval and not await self._is_healthy(client):
+                    await self._discard(client)
+                else:
+                    return client
+            return self._factory()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, client, broken=False):
+        try:
+            if broken or client.closed:
+                await self._discard(client)
+            else:
+                self._idle.append((client, time.monotonic()))
+            await self.evict_idle()
+        finally:
+            self._slots.release()
+
+    async def evict_idle(self):
+        """Closes clients that have sat unused for longer than the idle timeout."""
+        cutoff = time.monotonic() - self._idle_timeout
+        while self._idle and self._idle[0][1] < cutoff:
+            client, _ = self._idle.pop(0)
+            await self._discard(client)
+
+    async def close(self):
+        while self._idle:
+            client, _ = self._idle.pop()
+            await self._discard(client)
+
+    async def _is_healthy(self, client):
+        try:
+            await client.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    async def _discard(self, client):
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+def _create_turso_client(url=None, auth_token=None):
+    url = url or get_setting("TURSO_DATABASE_URL")
+    auth_token = auth_token or get_setting("TURSO_AUTH_TOKEN")
+
     # Final Fix: Change protocol to https, which is more stable than wss
     # in many cloud environments.
     if url.startswith("libsql://"):
         url = "https://" + url[len("libsql://"):]
 
     # The create_client function returns a client that supports async operations.
-    client = libsql_client.create_client(url=url, auth_token=auth_token)
+    return libsql_client.create_client(url=url, auth_token=auth_token)
+
+def _is_connection_error(exc):
+    """SQL errors leave the client usable; transport and server errors do not."""
+    if isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError, OSError)):
+        return True
+    if isinstance(exc, libsql_client.LibsqlError):
+        return not exc.code.startswith("SQLITE")
+    return False
+
+_backend = None
+
+def get_backend():
+    """
+    Returns the process-wide backend chosen by DB_BACKEND: "turso" (default)
+    pools remote libSQL clients, "sqlite" uses a local file at SQLITE_PATH.
+    Both hand out clients with the same execute/batch API.
+    """
+    global _backend
+    if _backend is None:
+        backend = str(get_setting("DB_BACKEND", "turso")).lower()
+        if backend == "sqlite":
+            from .sqlite_backend import LocalBackend
+            _backend = LocalBackend(get_setting("SQLITE_PATH", "hostel_meals.db"))
+        elif backend == "turso":
+            _backend = _create_pool(_create_turso_client)
+        else:
+            raise ValueError(f"Unknown DB_BACKEND: {backend}")
+    return _backend
+
+def _create_pool(factory):
+    return ClientPool(
+        factory,
+        max_size=int(get_setting("DB_POOL_SIZE", 8)),
+        idle_timeout=float(get_setting("DB_POOL_IDLE_TIMEOUT", 300)),
+        health_check_interval=float(get_setting("DB_POOL_HEALTH_CHECK_INTERVAL", 30)),
+    )
+
+def use_backend(backend):
+    """Replaces the configured backend, e.g. with a LocalBackend for benchmarks."""
+    global _backend
+    _backend = backend
+
+# --- Tenant Sharding ---
+# The configured database is the "main" shard. It also holds the catalog
+# (hostel_shards), which maps each hostel to the shard storing its rows;
+# hostels missing from it live on main. DB_SHARDS adds more shards as JSON,
+# e.g. {"b": {"url": "libsql://...", "auth_token": "..."}} or {"b": {"path": "b.db"}}.
+MAIN_SHARD = "main"
+SHARD_CATALOG_TTL = float(get_setting("SHARD_CATALOG_TTL", 60))
+
+class HostelUnavailable(RuntimeError):
+    """Raised for a hostel that is being moved between shards; callers retry later."""
+
+_shard_configs = None
+_shard_backends = {}
+_assignments = TTLCache(max_entries=100000)
+
+def _get_shard_configs():
+    global _shard_configs
+    if _shard_configs is None:
+        configs = get_setting("DB_SHARDS") or {}
+        _shard_configs = dict(json.loads(configs) if isinstance(configs, str) else configs)
+        if MAIN_SHARD in _shard_configs:
+            raise ValueError(f"DB_SHARDS cannot redefine the {MAIN_SHARD!r} shard; it is the configured database.")
+    return _shard_configs
+
+def shard_names():
+    """Every shard, main first."""
+    return [MAIN_SHARD, *sorted(set(_get_shard_configs()) | set(_shard_backends))]
+
+def is_sharded():
+    return len(shard_names()) > 1
+
+def get_shard_backend(shard):
+    """The backend for one shard, created on first use and kept for the process."""
+    if shard == MAIN_SHARD:
+        return get_backend()
+    backend = _shard_backends.get(shard)
+    if backend is None:
+        config = _get_shard_configs().get(shard)
+        if config is None:
+            raise ValueError(f"Unknown shard: {shard}")
+        if "path" in config:
+            from .sqlite_backend import LocalBackend
+            backend = LocalBackend(config["path"])
+        else:
+            backend = _create_pool(partial(_create_turso_client, config["url"], config.get("auth_token")))
+        _shard_backends[shard] = backend
+    return backend
+
+def use_shard_backend(shard, backend):
+    """Adds or replaces a shard's backend, e.g. a LocalBackend for benchmarks."""
+    _shard_backends[shard] = backend
+    _assignments.clear()
+
+async def shard_for(hostel_id):
+    """
+    The shard holding a hostel's rows. Catalog entries are cached for
+    SHARD_CATALOG_TTL seconds; hostels being moved are never cached, so every
+    process sees the new shard within one TTL of a move finishing.
+    """
+    if not is_sharded():
+        return MAIN_SHARD
+    shard = _assignments.get(hostel_id.upper())
+    if shard is not MISSING:
+        return shard
+    async with _borrow(get_backend()) as conn:
+        rs = await conn.execute('SELECT shard, state FROM hostel_shards WHERE hostel_id = ?', [hostel_id.upper()])
+    if rs.rows and rs.rows[0]['state'] == 'moving':
+        raise HostelUnavailable(f"Hostel {hostel_id.upper()} is being moved to another shard; try again shortly.")
+    shard = rs.rows[0]['shard'] if rs.rows else MAIN_SHARD
+    _assignments.set(hostel_id.upper(), shard, SHARD_CATALOG_TTL)
+    return shard
+
+def forget_assignment(hostel_id):
+    _assignments.invalidate(hostel_id.upper())
+
+async def place_hostel(hostel_id):
+    """
+    Reserves a hostel ID in the catalog on the open shard with the fewest
+    hostels (DB_OPEN_SHARDS, comma-separated, defaults to every shard).
+    Returns the shard, or None if the ID is already taken.
+    """
+    open_shards = [name.strip() for name in str(get_setting("DB_OPEN_SHARDS", "")).split(",") if name.strip()] or shard_names()
+    async with _borrow(get_backend()) as conn:
+        rs = await conn.execute('SELECT shard, COUNT(*) AS hostels FROM hostel_shards GROUP BY shard')
+        load = {row['shard']: row['hostels'] for row in rs.rows}
+        shard = min(open_shards, key=lambda name: (load.get(name, 0), name))
+        try:
+            await conn.execute('INSERT INTO hostel_shards (hostel_id, shard) VALUES (?, ?)', [hostel_id.upper(), shard])
+        except libsql_client.LibsqlError as e:
+            if not (e.code or "").startswith("SQLITE_CONSTRAINT"):
+                raise
+            return None
+    _assignments.set(hostel_id.upper(), shard, SHARD_CATALOG_TTL)
+    return shard
+
+async def unplace_hostel(hostel_id):
+    """Drops a catalog entry made by place_hostel whose hostel was never created."""
+    async with _borrow(get_backend()) as conn:
+        await conn.execute('DELETE FROM hostel_shards WHERE hostel_id = ?', [hostel_id.upper()])
+    forget_assignment(hostel_id)
+
+async def fan_out(func):
+    """Runs `await func(conn)` on every shard concurrently; results come back in shard_names() order."""
+    async def run(shard):
+        async with get_db_connection(shard=shard) as conn:
+            return await func(conn)
+    return await asyncio.gather(*(run(shard) for shard in shard_names()))
+
+# --- Database Connection ---
+@asynccontextmanager
+async def get_db_connection(hostel_id=None, shard=None):
+    """
+    Borrows a warm client from the shard holding `hostel_id` (or from `shard`,
+    or from main when neither is given) instead of opening a new connection
+    per call. Clients that fail at the transport level are dropped so the
+    next caller reconnects.
+    """
+    if shard is None:
+        shard = await shard_for(hostel_id) if hostel_id else MAIN_SHARD
+    async with _borrow(get_shard_backend(shard)) as conn:
+        yield conn
+
+@asynccontextmanager
+async def _borrow(backend):
+    if metrics.ENABLED:
+        started = time.perf_counter()
+        client = await backend.acquire()
+        metrics.record_connection(time.perf_counter() - started)
+    else:
+        client = await backend.acquire()
+    broken = False
     try:
-        yield client
+        yield metrics.InstrumentedClient(client) if metrics.ENABLED else client
     except Exception as e:
-        st.error(f"Database connection error: {e}")
+        broken = _is_connection_error(e)
         raise
     finally:
-        if client:
-            client.close()
-
-# --- Database Schema Setup ---
-async def setup_database_tables():
-    """
-    Initializes the database with the required tables asynchronously.
-    """
-    async with get_db_connection() as client:
-        # Use the async batch method
-        await client.batch([
-            'CREATE TABLE IF NOT EXISTS hostels (hostel_id TEXT PRIMARY KEY, hostel_name TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)',
-            '''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                hostel_id TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT NOT NULL CHECK(role IN ("student", "admin")),
-                added_by TEXT,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (hostel_id) REFERENCES hostels (hostel_id),
-                UNIQUE (hostel_id, user_id)
-            )
-            ''',
-            '''
-            CREATE TABLE IF NOT EXISTS meal_responses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                hostel_id TEXT NOT NULL,
-                student_id TEXT NOT NULL,
-                response_date DATE NOT NULL,
-                breakfast BOOLEAN NOT NULL,
-                lunch BOOLEAN NOT NULL,
-                dinner BOOLEAN NOT NULL,
-                breakfast_pass TEXT,
-                lunch_pass TEXT,
-                dinner_pass TEXT,
-                breakfast_attended BOOLEAN DEFAULT FALSE,
-                lunch_attended BOOLEAN DEFAULT FALSE,
-                dinner_attended BOOLEAN DEFAULT FALSE,
-                submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (hostel_id) REFERENCES hostels (hostel_id)
-            )
-            ''',
-            'CREATE TABLE IF NOT EXISTS daily_summary (id INTEGER PRIMARY KEY AUTOINCREMENT, hostel_id TEXT NOT NULL, report_date DATE NOT NULL, total_students INTEGER, breakfast_opt_in INTEGER, lunch_opt_in INTEGER, dinner_opt_in INTEGER, responded_students INTEGER, FOREIGN KEY (hostel_id) REFERENCES hostels (hostel_id), UNIQUE (hostel_id, report_date))',
-            '''
-            CREATE TABLE IF NOT EXISTS bills (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                hostel_id TEXT NOT NULL,
-                item_name TEXT NOT NULL,
-                price REAL NOT NULL,
-                purchase_date DATE NOT NULL,
-                FOREIGN KEY (hostel_id) REFERENCES hostels (hostel_id)
-            )
-            '''
-        ])
+        await backend.release(client, broken)
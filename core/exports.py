@@ -0,0 +1,55 @@
+import csv
+import gzip
+import io
+
+# format -> (mime type, file extension)
+FORMATS = {
+    "csv.gz": ("application/gzip", "csv.gz"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+class _CsvWriter:
+    def __init__(self, out, columns, compress):
+        self._gzip = gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) if compress else None
+        self._text = io.TextIOWrapper(self._gzip or out, encoding="utf-8", newline="")
+        self._csv = csv.writer(self._text)
+        self._csv.writerow(columns)
+
+    def write(self, rows):
+        self._csv.writerows(rows)
+
+    def close(self):
+        # Detach so closing the wrapper never closes the caller's file.
+        self._text.flush()
+        self._text.detach()
+        if self._gzip is not None:
+            self._gzip.close()
+
+class _ParquetWriter:
+    def __init__(self, out, columns, types):
+        # pyarrow ships with streamlit; import it only when a Parquet export runs.
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._schema = pa.schema([(name, pa.type_for_alias(kind)) for name, kind in zip(columns, types)])
+        self._writer = pq.ParquetWriter(out, self._schema, compression="zstd")
+
+    def write(self, rows):
+        arrays = [self._pa.array(values, type=field.type) for values, field in zip(zip(*rows), self._schema)]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+def open_writer(out, fmt, columns, types):
+    """
+    Returns a writer for `out` (a binary file) with write(rows) and close().
+    Each write appends one chunk: a block of CSV lines or a Parquet row group.
+    `types` are pyarrow type aliases, used by Parquet only.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == "parquet":
+        return _ParquetWriter(out, columns, types)
+    return _CsvWriter(out, columns, compress=fmt == "csv.gz")
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+MEALS = ("breakfast", "lunch", "dinner")
+LOOKBACK_DAYS = 56
+# Days on other weekdays still count, but less than the target weekday.
+OTHER_WEEKDAY_WEIGHT = 0.3
+# Pseudo-observations pulling sparse students toward the hostel-wide rate.
+PRIOR_STRENGTH = 3.0
+Z_95 = 1.96
+
+def _shrunk_rates(student_ids, weights, successes, prior):
+    """Weighted per-student success rates, shrunk toward `prior`, for all of `student_ids`."""
+    frame = pd.DataFrame({"student_id": student_ids, "w": weights, "ws": weights * successes})
+    sums = frame.groupby("student_id")[["w", "ws"]].sum()
+    return (sums["ws"] + PRIOR_STRENGTH * prior) / (sums["w"] + PRIOR_STRENGTH)
+
+def build_model(history, target_date):
+    """
+    Learns, from past meal_responses rows, each student's probability of
+    eating each meal when they do not respond (p_eat) and of showing up when
+    they opt in (p_show). Days where a meal's passes were verified use
+    attendance; other days fall back to the opt-in choice. Rows on the target's
+    weekday weigh more. Returns {meal: {"p_eat", "p_show", "prior_eat",
+    "prior_show"}} with the per-student values as pandas Series.
+    """
+    model = {}
+    if history.empty:
+        return {meal: {"p_eat": pd.Series(dtype=float), "p_show": pd.Series(dtype=float), "prior_eat": 1.0, "prior_show": 1.0} for meal in MEALS}
+    dates = pd.to_datetime(history["response_date"])
+    weights = np.where(dates.dt.dayofweek.to_numpy() == pd.Timestamp(target_date).dayofweek, 1.0, OTHER_WEEKDAY_WEIGHT)
+    student_ids = history["student_id"].to_numpy()
+    for meal in MEALS:
+        opted = history[meal].to_numpy(dtype=float)
+        attended = history[f"{meal}_attended"].fillna(0).to_numpy(dtype=float)
+        tracked = history.groupby("response_date")[f"{meal}_attended"].transform("sum").to_numpy(dtype=float) > 0
+        eaten = np.where(tracked, attended, opted)
+        prior_eat = np.average(eaten, weights=weights)
+        p_eat = _shrunk_rates(student_ids, weights, eaten, prior_eat)
+
+        show_mask = tracked & (opted > 0)
+        if show_mask.any():
+            prior_show = np.average(attended[show_mask], weights=weights[show_mask])
+            p_show = _shrunk_rates(student_ids[show_mask], weights[show_mask], attended[show_mask], prior_show)
+        else:
+            prior_show, p_show = 1.0, pd.Series(dtype=float)
+        model[meal] = {"p_eat": p_eat, "p_show": p_show, "prior_eat": float(prior_eat), "prior_show": float(prior_show)}
+    return model
+
+def predict(model, roster, responses):
+    """
+    Combines the model with tomorrow's explicit responses. Responders who
+    opted in count with their show-up probability; everyone else on the roster
+    counts with their probability of eating. Returns expected headcounts per
+    meal with a 95% interval from the Poisson-binomial variance.
+    """
+    roster = pd.Index(roster, name="student_id")
+    responses = responses.set_index("student_id") if not responses.empty else pd.DataFrame(columns=MEALS, index=pd.Index([], name="student_id"))
+    non_responders = roster.difference(responses.index)
+    forecast = {}
+    for meal in MEALS:
+        m = model[meal]
+        opted_in = responses.index[responses[meal].astype(bool).to_numpy()]
+        p_show = m["p_show"].reindex(opted_in).fillna(m["prior_show"]).to_numpy()
+        p_eat = m["p_eat"].reindex(non_responders).fillna(m["prior_eat"]).to_numpy()
+        probabilities = np.concatenate([p_show, p_eat])
+        expected = probabilities.sum()
+        margin = Z_95 * np.sqrt((probabilities * (1 - probabilities)).sum())
+        forecast[meal] = {
+            "expected": int(round(expected)),
+            "low": int(max(0, np.floor(expected - margin))),
+            "high": int(min(len(probabilities), np.ceil(expected + margin))),
+        }
+    return forecast
@@ -0,0 +1,160 @@
+import contextvars
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from .config import get_flag, get_setting
+
+# Read once at import so the disabled path costs a single boolean check.
+ENABLED = get_flag("DB_METRICS", False)
+METRICS_FILE = get_setting("METRICS_FILE")
+
+_lock = threading.Lock()
+_queries = {}      # fingerprint -> {"count", "seconds", "max_seconds", "rows"}
+_services = {}     # service function -> {"count", "seconds", "max_seconds"}
+_connections = {"count": 0, "seconds": 0.0, "max_seconds": 0.0}
+_renders = deque(maxlen=100)
+_thread_renders = threading.local()
+_current_render = contextvars.ContextVar("current_render", default=None)
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Normalizes SQL so statements differing only in literals or row counts group together."""
+    sql = re.sub(r"\s+", " ", sql).strip()
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\?(?:, \?)*\)(?:, \(\?(?:, \?)*\))+", "(...), ...", sql)
+    sql = re.sub(r"IN \(\?(?:, \?)+\)", "IN (...)", sql)
+    return sql
+
+def _add(stats, key, seconds, **extra):
+    entry = stats.setdefault(key, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, **dict.fromkeys(extra, 0)})
+    entry["count"] += 1
+    entry["seconds"] += seconds
+    entry["max_seconds"] = max(entry["max_seconds"], seconds)
+    for name, value in extra.items():
+        entry[name] += value
+
+def _sql_of(stmt):
+    if isinstance(stmt, str):
+        return stmt
+    if isinstance(stmt, tuple):
+        return stmt[0]
+    return stmt.sql
+
+def record_query(sql, seconds, rows):
+    render = _current_render.get()
+    with _lock:
+        _add(_queries, fingerprint(sql), seconds, rows=rows)
+        if render is not None:
+            render["round_trips"] += 1
+            render["db_seconds"] += seconds
+
+def record_connection(seconds):
+    with _lock:
+        _connections["count"] += 1
+        _connections["seconds"] += seconds
+        _connections["max_seconds"] = max(_connections["max_seconds"], seconds)
+
+class InstrumentedClient:
+    """Wraps a database client and records every round trip it makes."""
+    def __init__(self, client):
+        self._client = client
+
+    async def execute(self, stmt, args=None):
+        started = time.perf_counter()
+        rs = await self._client.execute(stmt, args)
+        record_query(_sql_of(stmt), time.perf_counter() - started, len(rs.rows))
+        return rs
+
+    async def batch(self, stmts):
+        started = time.perf_counter()
+        result_sets = await self._client.batch(stmts)
+        sql = "BATCH " + "; ".join(dict.fromkeys(fingerprint(_sql_of(stmt)) for stmt in stmts))
+        record_query(sql, time.perf_counter() - started, sum(len(rs.rows) for rs in result_sets))
+        return result_sets
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+def start_render(page):
+    """
+    Marks the start of a page render on the calling script thread. run_async
+    calls until finish_render are attributed to it.
+    """
+    if not ENABLED:
+        return
+    _thread_renders.render = {"page": page, "started_at": time.time(), "calls": 0, "round_trips": 0, "db_seconds": 0.0}
+
+def finish_render():
+    """Records the calling thread's render, and rewrites METRICS_FILE if one is set."""
+    render = getattr(_thread_renders, "render", None)
+    if render is None:
+        return
+    _thread_renders.render = None
+    with _lock:
+        _renders.append(render)
+    if METRICS_FILE:
+        write_metrics_file(METRICS_FILE)
+
+async def _tracked(coro, render):
+    if render is not None:
+        _current_render.set(render)
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        seconds = time.perf_counter() - started
+        with _lock:
+            _add(_services, coro.__qualname__, seconds)
+            if render is not None:
+                render["calls"] += 1
+
+def track_call(coro):
+    """Wraps a coroutine submitted by run_async so its service call and queries are recorded."""
+    return _tracked(coro, getattr(_thread_renders, "render", None))
+
+def snapshot():
+    with _lock:
+        return {
+            "queries": {key: dict(value) for key, value in _queries.items()},
+            "services": {key: dict(value) for key, value in _services.items()},
+            "connections": dict(_connections),
+            "renders": [dict(render) for render in _renders],
+        }
+
+def reset():
+    with _lock:
+        _queries.clear()
+        _services.clear()
+        _connections.update(count=0, seconds=0.0, max_seconds=0.0)
+        _renders.clear()
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def export_text():
+    """Renders all metrics in the plain-text Prometheus exposition format."""
+    data = snapshot()
+    lines = []
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    family("hostel_db_queries_total", "counter", "Database round trips by SQL fingerprint.", [({"sql": key}, value["count"]) for key, value in data["queries"].items()])
+    family("hostel_db_query_seconds_total", "counter", "Time spent in database round trips by SQL fingerprint.", [({"sql": key}, round(value["seconds"], 6)) for key, value in data["queries"].items()])
+    family("hostel_db_query_rows_total", "counter", "Rows returned by SQL fingerprint.", [({"sql": key}, value["rows"]) for key, value in data["queries"].items()])
+    family("hostel_service_calls_total", "counter", "Service calls submitted through run_async.", [({"service": key}, value["count"]) for key, value in data["services"].items()])
+    family("hostel_service_seconds_total", "counter", "Time spent in service calls.", [({"service": key}, round(value["seconds"], 6)) for key, value in data["services"].items()])
+    family("hostel_db_connection_acquires_total", "counter", "Connections acquired from the backend.", [({}, data["connections"]["count"])])
+    family("hostel_db_connection_setup_seconds_total", "counter", "Time spent acquiring connections.", [({}, round(data["connections"]["seconds"], 6))])
+    renders = data["renders"]
+    family("hostel_render_round_trips_avg", "gauge", "Average database round trips per recent page render.", [({}, round(sum(r["round_trips"] for r in renders) / len(renders), 3) if renders else 0)])
+    return "\n".join(lines) + "\n"
+
+def write_metrics_file(path):
+    with open(path, "w") as f:
+        f.write(export_text())
@@ -0,0 +1,284 @@
+import asyncio
+from libsql_client import LibsqlError, Statement
+from .database import get_db_connection, shard_names
+
+# --- Schema Migrations ---
+# Each entry is (version, description, statements). Versions are applied in
+# order, each in its own batch together with its schema_version row, so a
+# failed migration leaves no partial changes behind. Never edit an entry that
+# has shipped; append a new version instead.
+MIGRATIONS = [
+    (1, "initial schema", [
+        'CREATE TABLE IF NOT EXISTS hostels (hostel_id TEXT PRIMARY KEY, hostel_name TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)',
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hostel_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ("student", "admin")),
+            added_by TEXT,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (hostel_id) REFERENCES hostels (hostel_id),
+            UNIQUE (hostel_id, user_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS meal_responses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hostel_id TEXT NOT NULL,
+            student_id TEXT NOT NULL,
+            response_date DATE NOT NULL,
+            breakfast BOOLEAN NOT NULL,
+            lunch BOOLEAN NOT NULL,
+            dinner BOOLEAN NOT NULL,
+            breakfast_pass TEXT,
+            lunch_pass TEXT,
+            dinner_pass TEXT,
+            breakfast_attended BOOLEAN DEFAULT FALSE,
+            lunch_attended BOOLEAN DEFAULT FALSE,
+            dinner_attended BOOLEAN DEFAULT FALSE,
+            submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (hostel_id) REFERENCES hostels (hostel_id)
+        )
+        ''',
+        'CREATE TABLE IF NOT EXISTS daily_summary (id INTEGER PRIMARY KEY AUTOINCREMENT, hostel_id TEXT NOT NULL, report_date DATE NOT NULL, total_students INTEGER, breakfast_opt_in INTEGER, lunch_opt_in INTEGER, dinner_opt_in INTEGER, responded_students INTEGER, FOREIGN KEY (hostel_id) REFERENCES hostels (hostel_id), UNIQUE (hostel_id, report_date))',
+        '''
+        CREATE TABLE IF NOT EXISTS bills (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hostel_id TEXT NOT NULL,
+            item_name TEXT NOT NULL,
+            price REAL NOT NULL,
+            purchase_date DATE NOT NULL,
+            FOREIGN KEY (hostel_id) REFERENCES hostels (hostel_id)
+        )
+        '''
+    ]),
+    (2, "hot-path indexes and one response per student per day", [
+        # Older databases may hold duplicate responses; keep the latest one.
+        'DELETE FROM meal_responses WHERE id NOT IN (SELECT MAX(id) FROM meal_responses GROUP BY hostel_id, student_id, response_date)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_meal_responses_student_date ON meal_responses (hostel_id, student_id, response_date)',
+        'CREATE INDEX IF NOT EXISTS idx_meal_responses_hostel_date ON meal_responses (hostel_id, response_date, student_id)',
+        'CREATE INDEX IF NOT EXISTS idx_meal_responses_breakfast_pass ON meal_responses (hostel_id, response_date, breakfast_pass)',
+        'CREATE INDEX IF NOT EXISTS idx_meal_responses_lunch_pass ON meal_responses (hostel_id, response_date, lunch_pass)',
+        'CREATE INDEX IF NOT EXISTS idx_meal_responses_dinner_pass ON meal_responses (hostel_id, response_date, dinner_pass)',
+        'CREATE INDEX IF NOT EXISTS idx_users_hostel_role ON users (hostel_id, role)',
+        'CREATE INDEX IF NOT EXISTS idx_bills_hostel_date ON bills (hostel_id, purchase_date)'
+    ]),
+    (3, "meal_counters maintained by triggers on meal_responses", [
+        '''
+        CREATE TABLE IF NOT EXISTS meal_counters (
+            hostel_id TEXT NOT NULL,
+            counter_date DATE NOT NULL,
+            responded INTEGER NOT NULL DEFAULT 0,
+            breakfast INTEGER NOT NULL DEFAULT 0,
+            lunch INTEGER NOT NULL DEFAULT 0,
+            dinner INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hostel_id, counter_date)
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_meal_counters_insert AFTER INSERT ON meal_responses BEGIN
+            INSERT INTO meal_counters (hostel_id, counter_date, responded, breakfast, lunch, dinner)
+            VALUES (NEW.hostel_id, NEW.response_date, 1, NEW.breakfast, NEW.lunch, NEW.dinner)
+            ON CONFLICT (hostel_id, counter_date) DO UPDATE SET
+                responded = responded + 1,
+                breakfast = breakfast + excluded.breakfast,
+                lunch = lunch + excluded.lunch,
+                dinner = dinner + excluded.dinner;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_meal_counters_update AFTER UPDATE OF breakfast, lunch, dinner ON meal_responses BEGIN
+            UPDATE meal_counters SET
+                breakfast = breakfast + NEW.breakfast - OLD.breakfast,
+                lunch = lunch + NEW.lunch - OLD.lunch,
+                dinner = dinner + NEW.dinner - OLD.dinner
+            WHERE hostel_id = NEW.hostel_id AND counter_date = NEW.response_date;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_meal_counters_delete AFTER DELETE ON meal_responses BEGIN
+            UPDATE meal_counters SET
+                responded = responded - 1,
+                breakfast = breakfast - OLD.breakfast,
+                lunch = lunch - OLD.lunch,
+                dinner = dinner - OLD.dinner
+            WHERE hostel_id = OLD.hostel_id AND counter_date = OLD.response_date;
+        END
+        ''',
+        '''
+        INSERT OR REPLACE INTO meal_counters (hostel_id, counter_date, responded, breakfast, lunch, dinner)
+        SELECT hostel_id, response_date, COUNT(*), SUM(breakfast), SUM(lunch), SUM(dinner)
+        FROM meal_responses GROUP BY hostel_id, response_date
+        '''
+    ]),
+    (4, "day/week/month meal rollups with per-hostel watermarks", [
+        '''
+        CREATE TABLE IF NOT EXISTS meal_rollups (
+            hostel_id TEXT NOT NULL,
+            period TEXT NOT NULL CHECK(period IN ('day', 'week', 'month')),
+            period_start DATE NOT NULL,
+            days INTEGER NOT NULL,
+            total_students INTEGER NOT NULL,
+            responded INTEGER NOT NULL,
+            breakfast_opt_in INTEGER NOT NULL,
+            lunch_opt_in INTEGER NOT NULL,
+            dinner_opt_in INTEGER NOT NULL,
+            breakfast_attended INTEGER NOT NULL,
+            lunch_attended INTEGER NOT NULL,
+            dinner_attended INTEGER NOT NULL,
+            PRIMARY KEY (hostel_id, period, period_start)
+        )
+        ''',
+        'CREATE TABLE IF NOT EXISTS rollup_watermarks (hostel_id TEXT PRIMARY KEY, rolled_through DATE NOT NULL)'
+    ]),
+    (5, "covering index for bill listing and totals", [
+        'CREATE INDEX IF NOT EXISTS idx_bills_hostel_date_item_price ON bills (hostel_id, purchase_date, item_name, price)',
+        'DROP INDEX IF EXISTS idx_bills_hostel_date'
+    ]),
+    (6, "standing weekly meal preferences", [
+        # weekday follows SQLite's strftime('%w'): 0 is Sunday.
+        '''
+        CREATE TABLE IF NOT EXISTS meal_preferences (
+            hostel_id TEXT NOT NULL,
+            student_id TEXT NOT NULL,
+            weekday INTEGER NOT NULL CHECK(weekday BETWEEN 0 AND 6),
+            breakfast BOOLEAN NOT NULL,
+            lunch BOOLEAN NOT NULL,
+            dinner BOOLEAN NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (hostel_id, student_id, weekday)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_meal_preferences_hostel_weekday ON meal_preferences (hostel_id, weekday, student_id, breakfast, lunch, dinner)'
+    ]),
+    (7, "per-hostel keys for signed meal passes", [
+        'CREATE TABLE IF NOT EXISTS pass_keys (hostel_id TEXT PRIMARY KEY, secret TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'
+    ]),
+    (8, "catalog of which shard holds each hostel", [
+        # Only the main shard's copy is read; existing hostels are recorded as living there.
+        '''
+        CREATE TABLE IF NOT EXISTS hostel_shards (
+            hostel_id TEXT PRIMARY KEY,
+            shard TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'active' CHECK(state IN ('active', 'moving')),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "INSERT OR IGNORE INTO hostel_shards (hostel_id, shard) SELECT hostel_id, 'main' FROM hostels"
+    ]),
+    (9, "append-only meal response events with a per-hostel-day version", [
+        'CREATE TABLE IF NOT EXISTS meal_event_versions (hostel_id TEXT NOT NULL, event_date DATE NOT NULL, version INTEGER NOT NULL, PRIMARY KEY (hostel_id, event_date))',
+        # kind is 'insert' or 'update' for a student's choices, with prev_* the
+        # choices that were counted for them before; 'roster' and 'preferences'
+        # events mark changes that move the counts without a response.
+        '''
+        CREATE TABLE IF NOT EXISTS meal_response_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hostel_id TEXT NOT NULL,
+            event_date DATE NOT NULL,
+            version INTEGER NOT NULL,
+            kind TEXT NOT NULL CHECK(kind IN ('insert', 'update', 'roster', 'preferences')),
+            student_id TEXT,
+            breakfast BOOLEAN,
+            lunch BOOLEAN,
+            dinner BOOLEAN,
+            prev_breakfast BOOLEAN,
+            prev_lunch BOOLEAN,
+            prev_dinner BOOLEAN,
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (hostel_id, event_date, version)
+        )
+        ''',
+        # A first response replaces the student's standing preference for that weekday, or attending every meal.
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_meal_response_events_insert AFTER INSERT ON meal_responses BEGIN
+            INSERT INTO meal_event_versions (hostel_id, event_date, version) VALUES (NEW.hostel_id, NEW.response_date, 1)
+            ON CONFLICT (hostel_id, event_date) DO UPDATE SET version = version + 1;
+            INSERT INTO meal_response_events (hostel_id, event_date, version, kind, student_id, breakfast, lunch, dinner, prev_breakfast, prev_lunch, prev_dinner)
+            SELECT NEW.hostel_id, NEW.response_date, v.version, 'insert', NEW.student_id, NEW.breakfast, NEW.lunch, NEW.dinner,
+                   COALESCE(p.breakfast, TRUE), COALESCE(p.lunch, TRUE), COALESCE(p.dinner, TRUE)
+            FROM meal_event_versions v
+            LEFT JOIN meal_preferences p ON p.hostel_id = NEW.hostel_id AND p.student_id = NEW.student_id AND p.weekday = CAST(strftime('%w', NEW.response_date) AS INTEGER)
+            WHERE v.hostel_id = NEW.hostel_id AND v.event_date = NEW.response_date;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_meal_response_events_update AFTER UPDATE OF breakfast, lunch, dinner ON meal_responses
+        WHEN OLD.breakfast IS NOT NEW.breakfast OR OLD.lunch IS NOT NEW.lunch OR OLD.dinner IS NOT NEW.dinner BEGIN
+            INSERT INTO meal_event_versions (hostel_id, event_date, version) VALUES (NEW.hostel_id, NEW.response_date, 1)
+            ON CONFLICT (hostel_id, event_date) DO UPDATE SET version = version + 1;
+            INSERT INTO meal_response_events (hostel_id, event_date, version, kind, student_id, breakfast, lunch, dinner, prev_breakfast, prev_lunch, prev_dinner)
+            SELECT NEW.hostel_id, NEW.response_date, version, 'update', NEW.student_id, NEW.breakfast, NEW.lunch, NEW.dinner, OLD.breakfast, OLD.lunch, OLD.dinner
+            FROM meal_event_versions WHERE hostel_id = NEW.hostel_id AND event_date = NEW.response_date;
+        END
+        '''
+    ]),
+    # Kept on the main shard only; throttled hostel IDs need not exist anywhere.
+    (10, "login throttle counters shared between processes", [
+        '''
+        CREATE TABLE IF NOT EXISTS login_throttle (
+            hostel_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            spent REAL NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            blocked_until REAL NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (hostel_id, user_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_login_throttle_blocked ON login_throttle (blocked_until)'
+    ]),
+    (11, "shared token level for login throttle buckets", [
+        # 0 tokens as of updated_at; existing rows refill from there.
+        'ALTER TABLE login_throttle ADD COLUMN tokens REAL NOT NULL DEFAULT 0'
+    ]),
+    (12, "flag responses materialized from standing preferences", [
+        'ALTER TABLE meal_responses ADD COLUMN from_preference BOOLEAN NOT NULL DEFAULT FALSE'
+    ]),
+]
+
+_migrated = False
+_lock = None
+
+async def _schema_version(conn):
+    rs = await conn.execute('SELECT COALESCE(MAX(version), 0) AS version FROM schema_version')
+    return rs.rows[0]['version']
+
+async def _migrate_shard(shard):
+    """
+    Applies the missing versions to one shard. Several processes may start at
+    once: each version's row is inserted first in its batch, so a process that
+    lost the race fails on the primary key before any DDL runs, rolls back,
+    and carries on from the version the winner left.
+    """
+    async with get_db_connection(shard=shard) as conn:
+        await conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)')
+        current_version = await _schema_version(conn)
+        for version, description, statements in MIGRATIONS:
+            if version <= current_version:
+                continue
+            try:
+                await conn.batch([Statement('INSERT INTO schema_version (version, description) VALUES (?, ?)', [version, description]), *statements])
+            except LibsqlError:
+                current_version = await _schema_version(conn)
+                if current_version < version:
+                    raise
+
+async def run_migrations():
+    """
+    Brings every shard up to the latest schema version, concurrently. Runs at
+    most once per process; later calls return without touching the database.
+    """
+    global _migrated, _lock
+    if _migrated:
+        return
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        if _migrated:
+            return
+        await asyncio.gather(*(_migrate_shard(shard) for shard in shard_names()))
+        _migrated = True
@@ -0,0 +1,41 @@
+import base64
+import hashlib
+import hmac
+
+MEAL_PREFIXES = {"breakfast": "BRK", "lunch": "LCH", "dinner": "DNR"}
+# 40 bits of HMAC: a guessed code is accepted about once in a trillion tries,
+# and it still prints as 8 characters.
+MAC_BYTES = 5
+
+def _mac(key, hostel_id, student_id, day, meal):
+    message = f"{hostel_id.upper()}|{student_id.upper()}|{day}|{meal}".encode()
+    return base64.b32encode(hmac.new(key, message, hashlib.sha256).digest()[:MAC_BYTES]).decode()
+
+def sign_pass(key, hostel_id, student_id, day, meal):
+    """
+    The pass for one student, meal and day, e.g. LCH-S00042-K7QX2MPA. It carries
+    the student ID and a truncated HMAC over hostel, student, day and meal, so
+    anyone holding the hostel's key can check it without a lookup.
+    """
+    return f"{MEAL_PREFIXES[meal]}-{student_id.upper()}-{_mac(key, hostel_id, student_id, day, meal)}"
+
+def check_pass(key, hostel_id, day, meal, code):
+    """Returns the student ID a pass was signed for, or None if it is not a valid pass for this hostel, day and meal."""
+    prefix, _, rest = code.strip().upper().partition("-")
+    student_id, _, mac = rest.rpartition("-")
+    if prefix != MEAL_PREFIXES[meal] or not student_id:
+        return None
+    if not hmac.compare_digest(mac, _mac(key, hostel_id, student_id, day, meal)):
+        return None
+    return student_id
+
+def assign_meal_passes(key, hostel_id, day, responses):
+    """
+    Signs passes for one hostel-day. `responses` are rows with id, student_id,
+    breakfast, lunch and dinner; returns (id, breakfast_pass, lunch_pass,
+    dinner_pass) tuples with None for meals the student opted out of.
+    """
+    return [
+        (res['id'], *(sign_pass(key, hostel_id, res['student_id'], day, meal) if res[meal] else None for meal in MEAL_PREFIXES))
+        for res in responses
+    ]
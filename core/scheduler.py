@@ -0,0 +1,113 @@
+"""
+Generates the final report and meal passes for every hostel at the daily
+cutoff, so passes exist even when no admin clicks the button, and rolls up
+the day that just closed.
+
+    python -m core.scheduler                  # run every day at MEAL_CUTOFF_TIME
+    python -m core.scheduler --once           # run now for hostels still pending, then exit
+    python -m core.scheduler --report runs.jsonl
+
+Each run prints a JSON timing report (and appends it to --report when given).
+Hostels are processed concurrently, bounded by --concurrency. Failed hostels
+are retried with jittered exponential backoff. Runs are idempotent: hostels
+that already have tomorrow's report are skipped, so a restarted scheduler
+or an admin clicking the button at the same time is harmless.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from . import services as serv
+from .config import get_setting
+from utils import helpers as help
+
+RETRY_BASE_DELAY = 1.0
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))]
+
+async def _generate(hostel_id, semaphore, retries):
+    attempts, error = 0, None
+    started = time.perf_counter()
+    while True:
+        attempts += 1
+        # The slot is held per attempt, so hostels backing off don't block others.
+        async with semaphore:
+            try:
+                # Yesterday's attendance is final by now, so history pages find it rolled up.
+                await serv.refresh_meal_rollups(hostel_id)
+                status = "generated" if await serv.generate_daily_report(hostel_id) else "skipped"
+                break
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        if attempts > retries:
+            status = "failed"
+            break
+        await asyncio.sleep(RETRY_BASE_DELAY * 2 ** (attempts - 1) * random.uniform(0.5, 1.5))
+    return {"hostel_id": hostel_id, "status": status, "attempts": attempts, "seconds": time.perf_counter() - started, "error": error if status == "failed" else None}
+
+async def run_cutoff(concurrency, retries):
+    """Generates tomorrow's report for every pending hostel and returns the timing report."""
+    started_at = datetime.now()
+    started = time.perf_counter()
+    hostel_ids = await serv.get_hostels_pending_report()
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(_generate(hostel_id, semaphore, retries) for hostel_id in hostel_ids))
+    latencies = sorted(result["seconds"] for result in results)
+    return {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "report_date": (started_at + timedelta(days=1)).date().isoformat(),
+        "hostels": len(results),
+        "generated": sum(result["status"] == "generated" for result in results),
+        "skipped": sum(result["status"] == "skipped" for result in results),
+        "failed": sum(result["status"] == "failed" for result in results),
+        "retries": sum(result["attempts"] - 1 for result in results),
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "hostel_p50_ms": round(_percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "hostel_p95_ms": round(_percentile(latencies, 95) * 1000, 3) if latencies else None,
+        "hostel_max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+        "failures": [{"hostel_id": r["hostel_id"], "attempts": r["attempts"], "error": r["error"]} for r in results if r["status"] == "failed"],
+    }
+
+def seconds_until_cutoff(now=None):
+    now = now or datetime.now()
+    cutoff = datetime.combine(now.date(), serv.CUTOFF_TIME)
+    if cutoff <= now:
+        cutoff += timedelta(days=1)
+    return (cutoff - now).total_seconds()
+
+def _publish(report, path):
+    line = json.dumps(report)
+    print(line, flush=True)
+    if path:
+        with open(path, "a") as f:
+            f.write(line + "\n")
+
+async def run_forever(concurrency, retries, report_path):
+    # A scheduler started after today's cutoff catches up straight away.
+    if datetime.now().time() >= serv.CUTOFF_TIME:
+        _publish(await run_cutoff(concurrency, retries), report_path)
+    while True:
+        await asyncio.sleep(seconds_until_cutoff())
+        _publish(await run_cutoff(concurrency, retries), report_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate daily reports and meal passes for every hostel at the cutoff.")
+    parser.add_argument("--once", action="store_true", help="run immediately for pending hostels and exit")
+    parser.add_argument("--concurrency", type=int, default=int(get_setting("SCHEDULER_CONCURRENCY", 8)), help="hostels processed at once")
+    parser.add_argument("--retries", type=int, default=int(get_setting("SCHEDULER_RETRIES", 3)), help="retries per failed hostel")
+    parser.add_argument("--report", default=get_setting("SCHEDULER_REPORT_FILE"), help="append each run's JSON report to this file")
+    args = parser.parse_args(argv)
+
+    help.run_async(serv.setup_database())
+    if args.once:
+        _publish(help.run_async(run_cutoff(args.concurrency, args.retries)), args.report)
+    else:
+        help.run_async(run_forever(args.concurrency, args.retries, args.report))
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,60 @@
-import pandas as pd
-from datetime import datetime, timedelta
-import random
-import string
-from .database import get_db_connection
+import asyncio
+import contextvars
+import os
+import secrets
+from datetime import date, datetime, time, timedelta
+from .database import MAIN_SHARD, get_db_connection, place_hostel, unplace_hostel, fan_out
+from .config import get_flag, get_setting
+from . import passes
+from . import exports
+from .cache import TTLCache, MISSING
+from .attendance import AttendanceBuffer
+from .throttle import LoginThrottle
 from utils import helpers as help
-from libsql_client import Statement
+from libsql_client import LibsqlError, Statement
 
 async def setup_database():
-    from .database import setup_database_tables
-    await setup_database_tables()
+    from .migrations import run_migrations
+    await run_migrations()
 
-def generate_pass_suffix():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=3))
+# Choices for tomorrow close at this time; reports and passes are generated after it.
+CUTOFF_TIME = time.fromisoformat(get_setting("MEAL_CUTOFF_TIME", "18:00"))
+
+# Keeps multi-row statements well under SQLite's bound-parameter limit.
+MAX_ROWS_PER_STATEMENT = 100
+
+# --- Read-through cache for rarely changing dashboard data ---
+HOSTEL_NAME_TTL = 60 * 60
+STUDENT_COUNT_TTL = 5 * 60
+BILLS_TTL = 5 * 60
+BILLS_PAGE_SIZE = 50
+MEAL_INFO_TTL = 60
+# Live counts are kept exact by folding events; the TTL only bounds drift from writes that bypass services.
+LIVE_COUNTS_TTL = 60 * 60
+# How often the admin dashboard polls tomorrow's event version.
+LIVE_COUNTS_POLL_SECONDS = float(get_setting("LIVE_COUNTS_POLL_SECONDS", 10))
+FORECAST_MODEL_TTL = 24 * 60 * 60
+PASS_KEY_TTL = 24 * 60 * 60
+# The rollup watermark only moves forward, so a cached one is never wrong; the TTL just bounds memory.
+ROLLUP_WATERMARK_TTL = 24 * 60 * 60
+
+_cache = TTLCache(max_entries=10000)
+
+# numpy, pandas and the modules built on them (forecast, archive) are imported
+# inside the functions that need them, so the login page starts without them.
+def _to_frame(rs):
+    import pandas as pd
+    # Plain tuples build a DataFrame several times faster than Row objects.
+    return pd.DataFrame([row.astuple() for row in rs.rows], columns=rs.columns)
 
 # --- All functions that touch the DB are now async ---
 async def register_hostel(hostel_name, admin_user_id, admin_password):
     hostel_id = help.generate_unique_hostel_id(hostel_name)
-    hashed_password = help.hash_password(admin_password)
-    async with get_db_connection() as conn:
+    hashed_password = await help.hash_password_async(admin_password)
+    # The catalog entry reserves the ID across every shard and picks where the hostel lives.
+    if await place_hostel(hostel_id) is None:
+        return None
+    async with get_db_connection(hostel_id) as conn:
         try:
             await conn.batch([
                 Statement('INSERT INTO hostels (hostel_id, hostel_name) VALUES (?, ?)', [hostel_id.upper(), hostel_name]),
@@ -25,138 +62,1133 @@ async def register_hostel(hostel_name, admin_user_id, admin_password):
             ])
             return hostel_id
         except Exception:
-            return None
+            pass
+    await unplace_hostel(hostel_id)
+    return None
 
 async def add_user(hostel_id, user_id, password, role, added_by):
-    hashed_password = help.hash_password(password)
-    async with get_db_connection() as conn:
+    hashed_password = await help.hash_password_async(password)
+    statements = [Statement(
+        'INSERT INTO users (hostel_id, user_id, password_hash, role, added_by) VALUES (?, ?, ?, ?, ?)',
+        [hostel_id.upper(), user_id.upper(), hashed_password, role, added_by]
+    )]
+    if role == 'student':
+        statements.extend(_count_change_statements(hostel_id, 'roster', user_id))
+    async with get_db_connection(hostel_id) as conn:
         try:
-            await conn.execute(
-                'INSERT INTO users (hostel_id, user_id, password_hash, role, added_by) VALUES (?, ?, ?, ?, ?)',
-                [hostel_id.upper(), user_id.upper(), hashed_password, role, added_by]
-            )
+            await conn.batch(statements)
+            _cache.invalidate(("student_count", hostel_id.upper()))
             return True
         except Exception:
             return False
 
+async def import_students(hostel_id, roster, added_by):
+    """
+    Adds many students from (user_id, password) pairs. Rows are validated
+    locally and against existing users in one query, hashed in parallel and
+    inserted in chunked batch statements. Returns a {"user_id", "status"}
+    dict per input row, in order.
+    """
+    report, valid = [], {}
+    for user_id, password in roster:
+        user_id = (user_id or '').strip().upper()
+        if not user_id or not password:
+            report.append({"user_id": user_id, "status": "Missing user ID or password"})
+        elif user_id in valid:
+            report.append({"user_id": user_id, "status": "Duplicate in file"})
+        else:
+            valid[user_id] = password
+            report.append({"user_id": user_id, "status": None})
+
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute('SELECT user_id FROM users WHERE hostel_id = ?', [hostel_id.upper()])
+    existing = {row['user_id'] for row in rs.rows}
+    new_ids = [user_id for user_id in valid if user_id not in existing]
+
+    # Hashing happens outside the connection so it does not hold a pool slot.
+    hashes = await help.hash_passwords([valid[user_id] for user_id in new_ids])
+    rows = [(hostel_id.upper(), user_id, hashed, 'student', added_by) for user_id, hashed in zip(new_ids, hashes)]
+    batch_ops = []
+    for chunk in help.chunked(rows, MAX_ROWS_PER_STATEMENT):
+        placeholders = ', '.join(['(?, ?, ?, ?, ?)'] * len(chunk))
+        batch_ops.append(Statement(
+            f'INSERT INTO users (hostel_id, user_id, password_hash, role, added_by) VALUES {placeholders} ON CONFLICT (hostel_id, user_id) DO NOTHING RETURNING user_id',
+            [value for row in chunk for value in row]
+        ))
+    inserted = set()
+    if batch_ops:
+        async with get_db_connection(hostel_id) as conn:
+            result_sets = await conn.batch(batch_ops + _count_change_statements(hostel_id, 'roster', None))
+        for insert_rs in result_sets[:len(batch_ops)]:
+            inserted.update(row['user_id'] for row in insert_rs.rows)
+
+    if inserted:
+        _cache.invalidate(("student_count", hostel_id.upper()))
+    for entry in report:
+        if entry["status"] is None:
+            entry["status"] = "Added" if entry["user_id"] in inserted else "Already exists"
+    return report
+
 async def remove_user(hostel_id, user_id_to_remove):
-    async with get_db_connection() as conn:
-        rs = await conn.execute("SELECT id FROM users WHERE hostel_id = ? AND user_id = ?", [hostel_id.upper(), user_id_to_remove.upper()])
-        if rs.rows:
-            await conn.execute("DELETE FROM users WHERE id = ?", [rs.rows[0]["id"]])
-            return True
-        return False
+    async with get_db_connection(hostel_id) as conn:
+        rs, *_ = await conn.batch([
+            Statement("DELETE FROM users WHERE hostel_id = ? AND user_id = ?", [hostel_id.upper(), user_id_to_remove.upper()]),
+            Statement("DELETE FROM meal_preferences WHERE hostel_id = ? AND student_id = ?", [hostel_id.upper(), user_id_to_remove.upper()]),
+            *_count_change_statements(hostel_id, 'roster', user_id_to_remove)
+        ])
+    _cache.invalidate(("student_count", hostel_id.upper()))
+    return rs.rows_affected > 0
 
 async def change_password(hostel_id, user_id_to_change, new_password):
-    new_hashed_password = help.hash_password(new_password)
-    async with get_db_connection() as conn:
-        rs = await conn.execute("SELECT id FROM users WHERE hostel_id = ? AND user_id = ?", [hostel_id.upper(), user_id_to_change.upper()])
-        if rs.rows:
-            await conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", [new_hashed_password, rs.rows[0]["id"]])
-            return True
-        return False
+    new_hashed_password = await help.hash_password_async(new_password)
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute("UPDATE users SET password_hash = ? WHERE hostel_id = ? AND user_id = ?", [new_hashed_password, hostel_id.upper(), user_id_to_change.upper()])
+        return rs.rows_affected > 0
 
 async def check_hostel_id_exists(hostel_id):
-    async with get_db_connection() as conn:
+    async with get_db_connection(hostel_id) as conn:
         rs = await conn.execute('SELECT 1 FROM hostels WHERE hostel_id = ?', [hostel_id.upper()])
         return len(rs.rows) > 0
 
 async def get_hostel_name(hostel_id):
-    async with get_db_connection() as conn:
-        rs = await conn.execute('SELECT hostel_name FROM hostels WHERE hostel_id = ?', [hostel_id.upper()])
-        return rs.rows[0]["hostel_name"] if rs.rows else "Unknown"
+    key = ("hostel_name", hostel_id.upper())
+    name = _cache.get(key)
+    if name is MISSING:
+        async with get_db_connection(hostel_id) as conn:
+            rs = await conn.execute('SELECT hostel_name FROM hostels WHERE hostel_id = ?', [hostel_id.upper()])
+        if not rs.rows:
+            return "Unknown"
+        name = rs.rows[0]["hostel_name"]
+        _cache.set(key, name, HOSTEL_NAME_TTL)
+    return name
+
+async def get_student_count(hostel_id):
+    key = ("student_count", hostel_id.upper())
+    count = _cache.get(key)
+    if count is MISSING:
+        async with get_db_connection(hostel_id) as conn:
+            rs = await conn.execute("SELECT COUNT(*) as count FROM users WHERE hostel_id = ? AND role = 'student'", [hostel_id.upper()])
+        count = rs.rows[0]["count"]
+        _cache.set(key, count, STUDENT_COUNT_TTL)
+    return count
 
 async def get_hostel_summary(hostel_id):
-    async with get_db_connection() as conn:
-        name_rs = await conn.execute('SELECT hostel_name FROM hostels WHERE hostel_id = ?', [hostel_id.upper()])
-        count_rs = await conn.execute("SELECT COUNT(*) as count FROM users WHERE hostel_id = ? AND role = 'student'", [hostel_id.upper()])
-        return {"name": name_rs.rows[0]["hostel_name"] if name_rs.rows else "Unknown", "id": hostel_id, "student_count": count_rs.rows[0]["count"]}
+    return {"name": await get_hostel_name(hostel_id), "id": hostel_id, "student_count": await get_student_count(hostel_id)}
+
+# --- Login throttling ---
+LOGIN_THROTTLE_SYNC_INTERVAL = float(get_setting("LOGIN_THROTTLE_SYNC_INTERVAL", 2.0))
+LOGIN_THROTTLE_RETAIN = 24 * 60 * 60
+
+_login_throttle = LoginThrottle(
+    user_burst=int(get_setting("LOGIN_USER_BURST", 5)),
+    user_per_minute=float(get_setting("LOGIN_USER_PER_MINUTE", 5)),
+    hostel_burst=int(get_setting("LOGIN_HOSTEL_BURST", 50)),
+    hostel_per_minute=float(get_setting("LOGIN_HOSTEL_PER_MINUTE", 300)),
+    free_failures=int(get_setting("LOGIN_FREE_FAILURES", 3)),
+    backoff_base=float(get_setting("LOGIN_BACKOFF_BASE", 2.0)),
+    backoff_max=float(get_setting("LOGIN_BACKOFF_MAX", 60.0)),
+    max_keys=int(get_setting("LOGIN_THROTTLE_MAX_KEYS", 100000)),
+)
+_login_throttle_sync = None
+_login_throttle_pruned_at = 0.0
 
 async def authenticate_user(hostel_id, user_id, password):
-    async with get_db_connection() as conn:
-        rs = await conn.execute('SELECT password_hash, role FROM users WHERE hostel_id = ? AND user_id = ?', [hostel_id.upper(), user_id.upper()])
-        if rs.rows and help.verify_password(password, rs.rows[0]["password_hash"]):
-            return rs.rows[0]["role"]
+    """
+    Returns the user's role, or None for wrong credentials. While the hostel
+    or the user is over its attempt budget, or the user is blocked after
+    repeated failures, this raises throttle.LoginThrottled instead, before
+    any query or password hash.
+    """
+    hostel_id, user_id = hostel_id.upper(), user_id.upper()
+    _ensure_login_throttle_sync()
+    _login_throttle.acquire(hostel_id, user_id)
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute('SELECT password_hash, role FROM users WHERE hostel_id = ? AND user_id = ?', [hostel_id, user_id])
+    if not rs.rows:
+        _login_throttle.record(hostel_id, user_id, False)
         return None
+    # Only attempts that reach bcrypt use the hostel's budget. Verified on the worker pool after the connection is returned.
+    _login_throttle.charge_hostel(hostel_id)
+    role = rs.rows[0]["role"] if await help.verify_password_async(password, rs.rows[0]["password_hash"]) else None
+    _login_throttle.record(hostel_id, user_id, role is not None, checked=True)
+    return role
+
+async def sync_login_throttle():
+    """
+    Adds this process's login spending and failures to login_throttle on the
+    main shard and takes back each key's shared token level, failure streak
+    and block. Returns the number of keys written; changes that fail to write
+    are kept for the next sync. An idle process skips the trip.
+    """
+    global _login_throttle_pruned_at
+    now = datetime.now().timestamp()
+    changes = _login_throttle.drain(now)
+    if not changes:
+        return 0
+    batch_ops = []
+    for (hostel_id, user_id), (spent, failures, reset, blocked_until, rejected) in changes.items():
+        burst, rate = _login_throttle.limit((hostel_id, user_id))
+        # The shared level refills like the local bucket; a streak older than its block and LOGIN_BACKOFF_MAX starts over.
+        batch_ops.append(Statement(
+            'INSERT INTO login_throttle (hostel_id, user_id, spent, tokens, failures, blocked_until, rejected, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (hostel_id, user_id) DO UPDATE SET spent = spent + excluded.spent, '
+            'tokens = MIN(?, MIN(?, tokens + (excluded.updated_at - updated_at) * ?) - excluded.spent), '
+            'failures = CASE WHEN ? OR (blocked_until <= excluded.updated_at AND excluded.updated_at - updated_at >= ?) THEN excluded.failures ELSE failures + excluded.failures END, '
+            'blocked_until = CASE WHEN ? THEN excluded.blocked_until ELSE MAX(blocked_until, excluded.blocked_until) END, '
+            'rejected = rejected + excluded.rejected, updated_at = excluded.updated_at '
+            'RETURNING tokens, failures, blocked_until',
+            [hostel_id, user_id, spent, burst - spent, failures, blocked_until, rejected, now,
+             burst, burst, rate, reset, _login_throttle.backoff_max, reset]
+        ))
+    prune = now - _login_throttle_pruned_at >= LOGIN_THROTTLE_RETAIN / 24
+    if prune:
+        batch_ops.append(Statement('DELETE FROM login_throttle WHERE updated_at < ? AND blocked_until < ?', [now - LOGIN_THROTTLE_RETAIN, now]))
+    try:
+        async with get_db_connection(shard=MAIN_SHARD) as conn:
+            result_sets = await conn.batch(batch_ops)
+    except Exception:
+        _login_throttle.requeue(changes)
+        return 0
+    if prune:
+        _login_throttle_pruned_at = now
+    for key, rs in zip(changes, result_sets):
+        row = rs.rows[0]
+        _login_throttle.merge(key, row['tokens'], row['failures'], row['blocked_until'])
+    return len(changes)
+
+async def _sync_login_throttle_forever():
+    while True:
+        await asyncio.sleep(LOGIN_THROTTLE_SYNC_INTERVAL)
+        await sync_login_throttle()
+
+def _ensure_login_throttle_sync():
+    global _login_throttle_sync
+    if _login_throttle_sync is None or _login_throttle_sync.done():
+        # Started from inside a render; an empty context keeps the task's queries out of that render's metrics.
+        _login_throttle_sync = asyncio.get_running_loop().create_task(_sync_login_throttle_forever(), context=contextvars.Context())
+
+def get_login_throttle_stats():
+    """Counts of login attempts allowed, throttled, blocked and failed in this process, and of the buckets it tracks."""
+    return _login_throttle.snapshot()
+
+async def get_login_throttle_report(hostel_id, limit=20):
+    """The hostel's most rejected login keys across all processes, as of their last sync; user_id '' is the hostel-wide bucket."""
+    async with get_db_connection(shard=MAIN_SHARD) as conn:
+        rs = await conn.execute(
+            'SELECT user_id, rejected, failures, spent, blocked_until, updated_at FROM login_throttle '
+            'WHERE hostel_id = ? AND (rejected > 0 OR failures > 0) ORDER BY rejected DESC, failures DESC LIMIT ?',
+            [hostel_id.upper(), limit]
+        )
+    return [dict(zip(rs.columns, row.astuple())) for row in rs.rows]
+
+def _upsert_meal_responses_statement(rows):
+    """Builds one multi-row upsert; rows are (hostel_id, student_id, date, b, l, d) tuples."""
+    placeholders = ', '.join(['(?, ?, ?, ?, ?, ?)'] * len(rows))
+    return Statement(
+        f'INSERT INTO meal_responses (hostel_id, student_id, response_date, breakfast, lunch, dinner) VALUES {placeholders} '
+        'ON CONFLICT (hostel_id, student_id, response_date) DO UPDATE SET breakfast = excluded.breakfast, lunch = excluded.lunch, dinner = excluded.dinner, from_preference = FALSE',
+        [value for row in rows for value in row]
+    )
 
 async def submit_meal_response(hostel_id, student_id, breakfast, lunch, dinner):
     next_day = (datetime.now() + timedelta(days=1)).date().isoformat()
-    async with get_db_connection() as conn:
-        rs = await conn.execute('SELECT id FROM meal_responses WHERE hostel_id = ? AND student_id = ? AND response_date = ?', [hostel_id.upper(), student_id.upper(), next_day])
-        if rs.rows:
-            await conn.execute('UPDATE meal_responses SET breakfast = ?, lunch = ?, dinner = ? WHERE id = ?', [breakfast, lunch, dinner, rs.rows[0]['id']])
-        else:
-            await conn.execute('INSERT INTO meal_responses (hostel_id, student_id, response_date, breakfast, lunch, dinner) VALUES (?, ?, ?, ?, ?, ?)', [hostel_id.upper(), student_id.upper(), next_day, breakfast, lunch, dinner])
+    async with get_db_connection(hostel_id) as conn:
+        await conn.execute(_upsert_meal_responses_statement([(hostel_id.upper(), student_id.upper(), next_day, breakfast, lunch, dinner)]))
+    _cache.invalidate(("meal_info", hostel_id.upper(), student_id.upper(), next_day))
+
+async def submit_meal_responses(hostel_id, responses):
+    """
+    Writes many (student_id, breakfast, lunch, dinner) responses for tomorrow
+    in a single batch. Returns the number of responses written.
+    """
+    next_day = (datetime.now() + timedelta(days=1)).date().isoformat()
+    rows = [(hostel_id.upper(), student_id.upper(), next_day, b, l, d) for student_id, b, l, d in responses]
+    if not rows:
+        return 0
+    async with get_db_connection(hostel_id) as conn:
+        await conn.batch([_upsert_meal_responses_statement(chunk) for chunk in help.chunked(rows, MAX_ROWS_PER_STATEMENT)])
+    for _, student_id, _, _, _, _ in rows:
+        _cache.invalidate(("meal_info", hostel_id.upper(), student_id, next_day))
+    return len(rows)
+
+# Longest date range a student can plan in one submission.
+MAX_PLAN_DAYS = 62
+
+# Standing preferences for a weekday that have no explicit response on a date.
+# Binds hostel_id, weekday and the date.
+_UNANSWERED_PREFERENCES = (
+    "p.hostel_id = ? AND p.weekday = ? AND NOT EXISTS "
+    "(SELECT 1 FROM meal_responses m WHERE m.hostel_id = p.hostel_id AND m.student_id = p.student_id AND m.response_date = ?)"
+)
+
+def _weekday(day):
+    """The weekday number SQLite's strftime('%w') uses: 0 is Sunday."""
+    return day.isoweekday() % 7
+
+async def submit_meal_plan(hostel_id, student_id, start_date, end_date, breakfast, lunch, dinner):
+    """
+    Writes the same choices for every day from start_date to end_date
+    (inclusive) in one batch. Days before tomorrow are skipped. Returns the
+    number of days written.
+    """
+    first_day = max(start_date, (datetime.now() + timedelta(days=1)).date())
+    days = [(first_day + timedelta(days=i)).isoformat() for i in range((end_date - first_day).days + 1)]
+    if len(days) > MAX_PLAN_DAYS:
+        raise ValueError(f"A meal plan can cover at most {MAX_PLAN_DAYS} days.")
+    if not days:
+        return 0
+    rows = [(hostel_id.upper(), student_id.upper(), day, breakfast, lunch, dinner) for day in days]
+    async with get_db_connection(hostel_id) as conn:
+        await conn.batch([_upsert_meal_responses_statement(chunk) for chunk in help.chunked(rows, MAX_ROWS_PER_STATEMENT)])
+    for day in days:
+        _cache.invalidate(("meal_info", hostel_id.upper(), student_id.upper(), day))
+    return len(days)
+
+def _preferences_statement(hostel_id, student_id):
+    return Statement('SELECT weekday, breakfast, lunch, dinner FROM meal_preferences WHERE hostel_id = ? AND student_id = ?', [hostel_id.upper(), student_id.upper()])
+
+def _preferences_from(rs):
+    return {row['weekday']: (bool(row['breakfast']), bool(row['lunch']), bool(row['dinner'])) for row in rs.rows}
+
+async def get_meal_preferences(hostel_id, student_id):
+    """A student's standing choices as {weekday: (breakfast, lunch, dinner)}, with 0 for Sunday."""
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute(_preferences_statement(hostel_id, student_id))
+    return _preferences_from(rs)
+
+async def set_meal_preferences(hostel_id, student_id, preferences):
+    """
+    Replaces a student's standing choices with `preferences`, a dict of
+    {weekday: (breakfast, lunch, dinner)}. Weekdays left out fall back to
+    attending every meal. Nothing is written per day: preferences only become
+    meal_responses rows when the day's report is generated.
+    """
+    statements = [Statement('DELETE FROM meal_preferences WHERE hostel_id = ? AND student_id = ?', [hostel_id.upper(), student_id.upper()])]
+    if preferences:
+        placeholders = ', '.join(['(?, ?, ?, ?, ?, ?)'] * len(preferences))
+        statements.append(Statement(
+            f'INSERT INTO meal_preferences (hostel_id, student_id, weekday, breakfast, lunch, dinner) VALUES {placeholders}',
+            [value for weekday, (b, l, d) in sorted(preferences.items()) for value in (hostel_id.upper(), student_id.upper(), weekday, b, l, d)]
+        ))
+    statements.extend(_count_change_statements(hostel_id, 'preferences', student_id))
+    async with get_db_connection(hostel_id) as conn:
+        await conn.batch(statements)
 
 async def get_student_meal_info(hostel_id, student_id):
     next_day = (datetime.now() + timedelta(days=1)).date().isoformat()
-    async with get_db_connection() as conn:
-        rs = await conn.execute('SELECT breakfast, lunch, dinner, breakfast_pass, lunch_pass, dinner_pass FROM meal_responses WHERE hostel_id = ? AND student_id = ? AND response_date = ?', [hostel_id.upper(), student_id.upper(), next_day])
-        return rs.rows[0] if rs.rows else None
+    key = ("meal_info", hostel_id.upper(), student_id.upper(), next_day)
+    meal_info = _cache.get(key)
+    if meal_info is MISSING:
+        async with get_db_connection(hostel_id) as conn:
+            rs = await conn.execute('SELECT breakfast, lunch, dinner, breakfast_pass, lunch_pass, dinner_pass FROM meal_responses WHERE hostel_id = ? AND student_id = ? AND response_date = ?', [hostel_id.upper(), student_id.upper(), next_day])
+        meal_info = rs.rows[0] if rs.rows else None
+        _cache.set(key, meal_info, MEAL_INFO_TTL)
+    return meal_info
+
+def _live_counts_statement(hostel_id, next_day):
+    if get_flag("USE_MEAL_COUNTERS", True):
+        responses = ("SELECT COALESCE(c.responded, 0) AS responded, COALESCE(c.breakfast, 0) AS breakfast, COALESCE(c.lunch, 0) AS lunch, COALESCE(c.dinner, 0) AS dinner "
+                     "FROM (SELECT 1) LEFT JOIN meal_counters c ON c.hostel_id = ? AND c.counter_date = ?")
+    else:
+        responses = ("SELECT COUNT(*) AS responded, COALESCE(SUM(breakfast), 0) AS breakfast, COALESCE(SUM(lunch), 0) AS lunch, COALESCE(SUM(dinner), 0) AS dinner "
+                     "FROM meal_responses WHERE hostel_id = ? AND response_date = ?")
+    query = ("SELECT (SELECT COUNT(*) FROM users WHERE hostel_id = ? AND role = 'student') AS total, r.*, "
+             "p.preferred, p.preferred_breakfast, p.preferred_lunch, p.preferred_dinner "
+             f"FROM ({responses}) r, (SELECT COUNT(*) AS preferred, COALESCE(SUM(p.breakfast), 0) AS preferred_breakfast, "
+             "COALESCE(SUM(p.lunch), 0) AS preferred_lunch, COALESCE(SUM(p.dinner), 0) AS preferred_dinner "
+             f"FROM meal_preferences p WHERE {_UNANSWERED_PREFERENCES}) p")
+    return Statement(query, [hostel_id.upper(), hostel_id.upper(), next_day.isoformat(), hostel_id.upper(), _weekday(next_day), next_day.isoformat()])
+
+def _live_counts_from(rs):
+    row = rs.rows[0]
+    unresponded_count = row['total'] - row['responded'] - row['preferred']
+    return {
+        "breakfast": row['breakfast'] + row['preferred_breakfast'] + unresponded_count,
+        "lunch": row['lunch'] + row['preferred_lunch'] + unresponded_count,
+        "dinner": row['dinner'] + row['preferred_dinner'] + unresponded_count,
+        "responded": row['responded'],
+        "total": row['total']
+    }
+
+# --- Meal response events ---
+# Triggers append an event to meal_response_events whenever a response is
+# inserted or its choices change, and bump the hostel-day's version in
+# meal_event_versions. Roster and preference changes append an event with no
+# choices, which tells consumers to recompute instead of folding.
+MEAL_EVENT_COLUMNS = "version, kind, student_id, breakfast, lunch, dinner, prev_breakfast, prev_lunch, prev_dinner, recorded_at"
+
+def _event_version_statement(hostel_id, day):
+    return Statement('SELECT COALESCE((SELECT version FROM meal_event_versions WHERE hostel_id = ? AND event_date = ?), 0) AS version', [hostel_id.upper(), day.isoformat()])
+
+def _events_statement(hostel_id, day, after_version):
+    return Statement(f'SELECT {MEAL_EVENT_COLUMNS} FROM meal_response_events WHERE hostel_id = ? AND event_date = ? AND version > ? ORDER BY version', [hostel_id.upper(), day.isoformat(), after_version])
+
+def _count_change_statements(hostel_id, kind, student_id):
+    """Records a roster or preference change against tomorrow's version, in the caller's batch."""
+    next_day = (datetime.now() + timedelta(days=1)).date().isoformat()
+    return [
+        Statement('INSERT INTO meal_event_versions (hostel_id, event_date, version) VALUES (?, ?, 1) ON CONFLICT (hostel_id, event_date) DO UPDATE SET version = version + 1', [hostel_id.upper(), next_day]),
+        Statement(
+            'INSERT INTO meal_response_events (hostel_id, event_date, version, kind, student_id) SELECT hostel_id, event_date, version, ?, ? FROM meal_event_versions WHERE hostel_id = ? AND event_date = ?',
+            [kind, student_id.upper() if student_id else None, hostel_id.upper(), next_day]
+        )
+    ]
+
+def fold_meal_events(counts, events):
+    """
+    Applies events, oldest first, to live counts as returned by
+    get_live_meal_counts. Returns the new counts, or None if an event is a
+    roster or preference change and the counts must be read again.
+    """
+    counts = dict(counts)
+    for event in events:
+        if event['kind'] not in ('insert', 'update'):
+            return None
+        for meal in ("breakfast", "lunch", "dinner"):
+            counts[meal] += int(event[meal]) - int(event[f'prev_{meal}'])
+        if event['kind'] == 'insert':
+            counts['responded'] += 1
+        counts['version'] = event['version']
+    return counts
+
+async def get_meal_event_version(hostel_id, day=None):
+    """The current version of a hostel-day (tomorrow by default); 0 before its first event. One primary-key read."""
+    day = day or (datetime.now() + timedelta(days=1)).date()
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute(_event_version_statement(hostel_id, day))
+    return rs.rows[0]['version']
+
+async def get_meal_events(hostel_id, day, after_version=0, limit=None):
+    """
+    A hostel-day's events after `after_version`, oldest first: the audit trail
+    of who changed which meals, and when. With `limit`, only the latest ones.
+    """
+    async with get_db_connection(hostel_id) as conn:
+        if limit:
+            # The latest `limit` events, still returned oldest first.
+            rs = await conn.execute(
+                f'SELECT * FROM (SELECT {MEAL_EVENT_COLUMNS} FROM meal_response_events WHERE hostel_id = ? AND event_date = ? AND version > ? ORDER BY version DESC LIMIT ?) ORDER BY version',
+                [hostel_id.upper(), day.isoformat(), after_version, limit]
+            )
+        else:
+            rs = await conn.execute(_events_statement(hostel_id, day, after_version))
+    return [dict(zip(rs.columns, row.astuple())) for row in rs.rows]
+
+def _live_counts_statements(hostel_id, next_day, state):
+    """A full read of the counts and their version, or just the events since the cached state."""
+    if state is MISSING:
+        return [_event_version_statement(hostel_id, next_day), _live_counts_statement(hostel_id, next_day)]
+    return [_events_statement(hostel_id, next_day, state['version'])]
+
+def _live_counts_from_sets(hostel_id, next_day, state, result_sets):
+    key = ("live_counts", hostel_id.upper(), next_day.isoformat())
+    if state is MISSING:
+        counts = {**_live_counts_from(result_sets[1]), "version": result_sets[0].rows[0]['version']}
+        _cache.set(key, counts, LIVE_COUNTS_TTL)
+        return counts
+    counts = fold_meal_events(state, result_sets[0].rows)
+    if counts is not None:
+        # Folded counts keep the full read's expiry, so one still happens every LIVE_COUNTS_TTL.
+        _cache.replace(key, counts)
+    return counts
 
 async def get_live_meal_counts(hostel_id):
+    """
+    Tomorrow's opt-in counts and their event version. Students without a
+    response follow their standing preference for tomorrow's weekday, and are
+    otherwise assumed to attend every meal. The first call reads the counts in
+    full (from the trigger-maintained meal_counters row with
+    USE_MEAL_COUNTERS); later calls only fold the events recorded since.
+    """
+    next_day = (datetime.now() + timedelta(days=1)).date()
+    state = _cache.get(("live_counts", hostel_id.upper(), next_day.isoformat()))
+    async with get_db_connection(hostel_id) as conn:
+        counts = _live_counts_from_sets(hostel_id, next_day, state, await conn.batch(_live_counts_statements(hostel_id, next_day, state)))
+        if counts is None:
+            counts = _live_counts_from_sets(hostel_id, next_day, MISSING, await conn.batch(_live_counts_statements(hostel_id, next_day, MISSING)))
+    return counts
+
+def _forecast_statements(hostel_id, next_day, with_history):
+    from . import forecast
+    statements = [
+        Statement("SELECT user_id FROM users WHERE hostel_id = ? AND role = 'student'", [hostel_id.upper()]),
+        # Standing preferences count as responses for students who have not answered.
+        Statement(
+            'SELECT student_id, breakfast, lunch, dinner FROM meal_responses WHERE hostel_id = ? AND response_date = ? '
+            f'UNION ALL SELECT p.student_id, p.breakfast, p.lunch, p.dinner FROM meal_preferences p WHERE {_UNANSWERED_PREFERENCES}',
+            [hostel_id.upper(), next_day.isoformat(), hostel_id.upper(), _weekday(next_day), next_day.isoformat()]
+        )
+    ]
+    if with_history:
+        statements.append(Statement(
+            'SELECT student_id, response_date, breakfast, lunch, dinner, breakfast_attended, lunch_attended, dinner_attended FROM meal_responses '
+            'WHERE hostel_id = ? AND response_date >= ? AND response_date < ?',
+            [hostel_id.upper(), (next_day - timedelta(days=forecast.LOOKBACK_DAYS)).isoformat(), (next_day - timedelta(days=1)).isoformat()]
+        ))
+    return statements
+
+def _forecast_from(hostel_id, next_day, model, result_sets):
+    from . import forecast
+    if model is MISSING:
+        model = forecast.build_model(_to_frame(result_sets[2]), next_day)
+        _cache.set(("forecast_model", hostel_id.upper(), next_day.isoformat()), model, FORECAST_MODEL_TTL)
+    roster = [row['user_id'] for row in result_sets[0].rows]
+    return forecast.predict(model, roster, _to_frame(result_sets[1]))
+
+async def get_meal_forecast(hostel_id):
+    """
+    Predicts tomorrow's headcount per meal with a 95% interval, using each
+    student's history instead of assuming non-responders eat everything. The
+    fitted model is cached per hostel-day; only the roster and tomorrow's
+    responses are re-read on each call.
+    """
+    next_day = (datetime.now() + timedelta(days=1)).date()
+    model = _cache.get(("forecast_model", hostel_id.upper(), next_day.isoformat()))
+    async with get_db_connection(hostel_id) as conn:
+        result_sets = await conn.batch(_forecast_statements(hostel_id, next_day, model is MISSING))
+    return _forecast_from(hostel_id, next_day, model, result_sets)
+
+async def get_admin_dashboard_snapshot(hostel_id, bill_filters=(None, None, None), bills_after=None):
+    """
+    Everything the admin dashboard shows before any interaction: the hostel
+    summary, live counts, forecast, and the bill totals and bills page for
+    `bill_filters` (start date, end date, item query) after `bills_after`,
+    read in one batched round trip. Cached values (the hostel name, the
+    forecast model, bill totals) are left out of the batch.
+    """
+    next_day = (datetime.now() + timedelta(days=1)).date()
+    name = _cache.get(("hostel_name", hostel_id.upper()))
+    model = _cache.get(("forecast_model", hostel_id.upper(), next_day.isoformat()))
+    state = _cache.get(("live_counts", hostel_id.upper(), next_day.isoformat()))
+    live_statements = _live_counts_statements(hostel_id, next_day, state)
+    forecast_statements = _forecast_statements(hostel_id, next_day, model is MISSING)
+    totals_key, totals, totals_statements = _bill_totals_statements(hostel_id, *bill_filters)
+    statements = [*live_statements, *forecast_statements, *totals_statements,
+                  _bills_page_statement(hostel_id, *bill_filters, bills_after, BILLS_PAGE_SIZE)]
+    if name is MISSING:
+        statements.append(Statement('SELECT hostel_name FROM hostels WHERE hostel_id = ?', [hostel_id.upper()]))
+    async with get_db_connection(hostel_id) as conn:
+        result_sets = await conn.batch(statements)
+    if name is MISSING:
+        name_rs = result_sets.pop()
+        name = name_rs.rows[0]['hostel_name'] if name_rs.rows else "Unknown"
+        if name_rs.rows:
+            _cache.set(("hostel_name", hostel_id.upper()), name, HOSTEL_NAME_TTL)
+    bills_page = _bills_page_from(result_sets.pop(), BILLS_PAGE_SIZE)
+    forecast_end = len(live_statements) + len(forecast_statements)
+    bill_totals = _bill_totals_from(totals_key, totals, result_sets[forecast_end:])
+    live_counts = _live_counts_from_sets(hostel_id, next_day, state, result_sets[:len(live_statements)])
+    if live_counts is None:
+        # A roster or preference change since the cached counts; only this read is repeated.
+        live_counts = await get_live_meal_counts(hostel_id)
+    _cache.set(("student_count", hostel_id.upper()), live_counts['total'], STUDENT_COUNT_TTL)
+    return {
+        "name": name,
+        "id": hostel_id,
+        "student_count": live_counts['total'],
+        "live_counts": live_counts,
+        "forecast": _forecast_from(hostel_id, next_day, model, result_sets[len(live_statements):forecast_end]),
+        "bills": {"filters": tuple(bill_filters), "after": bills_after, "totals": bill_totals, "page": bills_page},
+    }
+
+async def get_student_dashboard_snapshot(hostel_id, student_id):
+    """
+    The hostel name, tomorrow's meal info and standing preferences for the
+    student dashboard in one batched round trip, skipping cached values.
+    """
     next_day = (datetime.now() + timedelta(days=1)).date().isoformat()
-    async with get_db_connection() as conn:
-        rs = await conn.execute('SELECT breakfast, lunch, dinner FROM meal_responses WHERE hostel_id = ? AND response_date = ?', [hostel_id.upper(), next_day])
-        df = pd.DataFrame(rs.rows, columns=rs.columns)
-        
-        total_students_rs = await conn.execute("SELECT COUNT(*) as count FROM users WHERE hostel_id = ? AND role = 'student'", [hostel_id.upper()])
-        total_students = total_students_rs.rows[0]['count'] if total_students_rs.rows else 0
-        
-        responded_count = len(df)
-        unresponded_count = total_students - responded_count
-        
-        return {
-            "breakfast": df['breakfast'].sum() + unresponded_count if not df.empty else unresponded_count,
-            "lunch": df['lunch'].sum() + unresponded_count if not df.empty else unresponded_count,
-            "dinner": df['dinner'].sum() + unresponded_count if not df.empty else unresponded_count,
-            "responded": responded_count,
-            "total": total_students
-        }
+    name_key = ("hostel_name", hostel_id.upper())
+    info_key = ("meal_info", hostel_id.upper(), student_id.upper(), next_day)
+    name, meal_info = _cache.get(name_key), _cache.get(info_key)
+    statements = [_preferences_statement(hostel_id, student_id)]
+    if meal_info is MISSING:
+        statements.append(Statement('SELECT breakfast, lunch, dinner, breakfast_pass, lunch_pass, dinner_pass FROM meal_responses WHERE hostel_id = ? AND student_id = ? AND response_date = ?', [hostel_id.upper(), student_id.upper(), next_day]))
+    if name is MISSING:
+        statements.append(Statement('SELECT hostel_name FROM hostels WHERE hostel_id = ?', [hostel_id.upper()]))
+    async with get_db_connection(hostel_id) as conn:
+        result_sets = await conn.batch(statements)
+    if name is MISSING:
+        name_rs = result_sets.pop()
+        name = name_rs.rows[0]['hostel_name'] if name_rs.rows else "Unknown"
+        if name_rs.rows:
+            _cache.set(name_key, name, HOSTEL_NAME_TTL)
+    if meal_info is MISSING:
+        info_rs = result_sets.pop()
+        meal_info = info_rs.rows[0] if info_rs.rows else None
+        _cache.set(info_key, meal_info, MEAL_INFO_TTL)
+    return {"hostel_name": name, "meal_info": meal_info, "preferences": _preferences_from(result_sets[0])}
+
+def _set_passes_statement(rows):
+    """Writes a chunk of (id, breakfast_pass, lunch_pass, dinner_pass) tuples in one UPDATE."""
+    placeholders = ', '.join(['(?, ?, ?, ?)'] * len(rows))
+    return Statement(
+        'UPDATE meal_responses SET breakfast_pass = v.column2, lunch_pass = v.column3, dinner_pass = v.column4 '
+        f'FROM (VALUES {placeholders}) AS v WHERE meal_responses.id = v.column1',
+        [value for row in rows for value in row]
+    )
 
 async def generate_daily_report_and_passes(hostel_id):
     report_date = (datetime.now() + timedelta(days=1)).date().isoformat()
-    async with get_db_connection() as conn:
-        summary_rs = await conn.execute('SELECT 1 FROM daily_summary WHERE hostel_id = ? AND report_date = ?', [hostel_id.upper(), report_date])
+    if not await generate_daily_report(hostel_id):
+        return "Report and passes for this date have already been generated."
+    return f"Successfully generated report and meal passes for {report_date}."
+
+async def generate_daily_report(hostel_id):
+    """
+    Writes tomorrow's daily_summary and meal passes for a hostel. Idempotent:
+    returns False without changing anything when the report already exists,
+    including when a concurrent run wins the race.
+    """
+    next_day = (datetime.now() + timedelta(days=1)).date()
+    report_date = next_day.isoformat()
+    key = await get_pass_key(hostel_id)
+    async with get_db_connection(hostel_id) as conn:
+        # Standing preferences become real responses here, once per hostel-day,
+        # so they get passes like any other response. They are flagged so the
+        # summary does not count those students as having responded.
+        summary_rs, _, responses_rs = await conn.batch([
+            Statement('SELECT 1 FROM daily_summary WHERE hostel_id = ? AND report_date = ?', [hostel_id.upper(), report_date]),
+            Statement(
+                'INSERT INTO meal_responses (hostel_id, student_id, response_date, breakfast, lunch, dinner, from_preference) '
+                'SELECT p.hostel_id, p.student_id, ?, p.breakfast, p.lunch, p.dinner, TRUE FROM meal_preferences p '
+                'JOIN users u ON u.hostel_id = p.hostel_id AND u.user_id = p.student_id '
+                f'WHERE {_UNANSWERED_PREFERENCES} AND NOT EXISTS (SELECT 1 FROM daily_summary WHERE hostel_id = ? AND report_date = ?) '
+                'ON CONFLICT DO NOTHING',
+                [report_date, hostel_id.upper(), _weekday(next_day), report_date, hostel_id.upper(), report_date]
+            ),
+            Statement('SELECT id, student_id, breakfast, lunch, dinner FROM meal_responses WHERE hostel_id = ? AND response_date = ?', [hostel_id.upper(), report_date])
+        ])
         if summary_rs.rows:
-            return "Report and passes for this date have already been generated."
-
-        responses_rs = await conn.execute('SELECT id, student_id, breakfast, lunch, dinner FROM meal_responses WHERE hostel_id = ? AND response_date = ?', [hostel_id.upper(), report_date])
-        
-        batch_ops = []
-        for res in responses_rs.rows:
-            b_pass = f"BRK-{generate_pass_suffix()}" if res['breakfast'] else None
-            l_pass = f"LCH-{generate_pass_suffix()}" if res['lunch'] else None
-            d_pass = f"DNR-{generate_pass_suffix()}" if res['dinner'] else None
-            batch_ops.append(Statement('UPDATE meal_responses SET breakfast_pass = ?, lunch_pass = ?, dinner_pass = ? WHERE id = ?', [b_pass, l_pass, d_pass, res['id']]))
-        
-        live_counts = await get_live_meal_counts(hostel_id)
-        batch_ops.append(Statement('INSERT INTO daily_summary (hostel_id, report_date, total_students, breakfast_opt_in, lunch_opt_in, dinner_opt_in, responded_students) VALUES (?, ?, ?, ?, ?, ?, ?)', [hostel_id.upper(), report_date, live_counts['total'], live_counts['breakfast'], live_counts['lunch'], live_counts['dinner'], live_counts['responded']]))
-        
-        await conn.batch(batch_ops)
-        return f"Successfully generated report and meal passes for {report_date}."
+            return False
+
+        # The summary goes first so a concurrent run fails on UNIQUE (hostel_id,
+        # report_date) and rolls back before any pass is overwritten.
+        batch_ops = [Statement(
+            'INSERT INTO daily_summary (hostel_id, report_date, total_students, breakfast_opt_in, lunch_opt_in, dinner_opt_in, responded_students) '
+            'SELECT ?, ?, t.total, COALESCE(SUM(m.breakfast), 0) + t.total - COUNT(m.id), COALESCE(SUM(m.lunch), 0) + t.total - COUNT(m.id), COALESCE(SUM(m.dinner), 0) + t.total - COUNT(m.id), COUNT(m.id) - COALESCE(SUM(m.from_preference), 0) '
+            "FROM (SELECT COUNT(*) AS total FROM users WHERE hostel_id = ? AND role = 'student') t "
+            'LEFT JOIN meal_responses m ON m.hostel_id = ? AND m.response_date = ?',
+            [hostel_id.upper(), report_date, hostel_id.upper(), hostel_id.upper(), report_date]
+        )]
+        assigned = passes.assign_meal_passes(key, hostel_id, report_date, responses_rs.rows)
+        batch_ops.extend(_set_passes_statement(chunk) for chunk in help.chunked(assigned, MAX_ROWS_PER_STATEMENT))
+
+        try:
+            await conn.batch(batch_ops)
+        except LibsqlError as e:
+            if not (e.code or "").startswith("SQLITE_CONSTRAINT"):
+                raise
+            return False
+    # Every student's cached meal info now lacks the passes just written.
+    _cache.invalidate_prefix(("meal_info", hostel_id.upper()))
+    return True
+
+def _merge_hostel_ids(result_sets):
+    # A hostel caught mid-move briefly has rows on two shards; list it once.
+    return sorted({row['hostel_id'] for rs in result_sets for row in rs.rows})
+
+async def get_hostels_pending_report():
+    """IDs of hostels that have no daily_summary for tomorrow yet, across every shard."""
+    report_date = (datetime.now() + timedelta(days=1)).date().isoformat()
+    async def pending(conn):
+        return await conn.execute(
+            'SELECT hostel_id FROM hostels h WHERE NOT EXISTS (SELECT 1 FROM daily_summary s WHERE s.hostel_id = h.hostel_id AND s.report_date = ?)',
+            [report_date]
+        )
+    return _merge_hostel_ids(await fan_out(pending))
+
+async def get_pass_key(hostel_id):
+    """The hostel's pass-signing key, created on first use and cached for the process."""
+    key = _cache.get(("pass_key", hostel_id.upper()))
+    if key is MISSING:
+        async with get_db_connection(hostel_id) as conn:
+            _, rs = await conn.batch([
+                Statement('INSERT INTO pass_keys (hostel_id, secret) VALUES (?, ?) ON CONFLICT (hostel_id) DO NOTHING', [hostel_id.upper(), secrets.token_hex(32)]),
+                Statement('SELECT secret FROM pass_keys WHERE hostel_id = ?', [hostel_id.upper()])
+            ])
+        key = bytes.fromhex(rs.rows[0]['secret'])
+        _cache.set(("pass_key", hostel_id.upper()), key, PASS_KEY_TTL)
+    return key
+
+def _pass_columns(meal_type):
+    meal = meal_type.lower()
+    if meal not in passes.MEAL_PREFIXES:
+        raise ValueError(f"Unknown meal type: {meal_type}")
+    return passes.MEAL_PREFIXES[meal], f"{meal}_pass", f"{meal}_attended"
+
+def full_pass_code(meal_type, code):
+    """Normalizes a scanned code or bare suffix to its stored form, e.g. BRK-7QX."""
+    prefix, _, _ = _pass_columns(meal_type)
+    code = code.strip().upper()
+    return code if code.startswith(f"{prefix}-") else f"{prefix}-{code}"
 
 async def verify_meal_pass(hostel_id, meal_type, pass_suffix):
-    pass_suffix = pass_suffix.upper()
-    full_pass = f"{meal_type.upper()[:3]}-{pass_suffix}"
-    pass_column = f"{meal_type.lower()}_pass"
-    attended_column = f"{meal_type.lower()}_attended"
+    (_, msg, student), = await verify_meal_passes(hostel_id, meal_type, [pass_suffix])
+    return msg, student
+
+async def verify_meal_passes(hostel_id, meal_type, pass_codes):
+    """
+    Verifies a batch of scanned codes in one round trip. Each pass is claimed
+    with a conditional UPDATE, so two counters can never both accept it.
+    Returns (full_pass, message, student_id) tuples in input order; student_id
+    is None when the pass was rejected.
+    """
+    _, pass_column, attended_column = _pass_columns(meal_type)
     report_date = (datetime.now() + timedelta(days=1)).date().isoformat()
-    async with get_db_connection() as conn:
-        rs = await conn.execute(f"SELECT id, student_id, {attended_column} FROM meal_responses WHERE hostel_id = ? AND {pass_column} = ? AND response_date = ?", [hostel_id.upper(), full_pass, report_date])
-        if not rs.rows:
-            return "Invalid Pass Code", None
-        if rs.rows[0][attended_column]:
-            return f"Pass already used by {rs.rows[0]['student_id']}", None
-        await conn.execute(f"UPDATE meal_responses SET {attended_column} = TRUE WHERE id = ?", [rs.rows[0]['id']])
-        return f"Pass Verified for {rs.rows[0]['student_id']}", rs.rows[0]['student_id']
+    full_passes = [full_pass_code(meal_type, code) for code in pass_codes]
+    unique_passes = list(dict.fromkeys(full_passes))
+    batch_ops = []
+    for chunk in help.chunked(unique_passes, MAX_ROWS_PER_STATEMENT):
+        placeholders = ', '.join(['?'] * len(chunk))
+        batch_ops.append(Statement(f"UPDATE meal_responses SET {attended_column} = TRUE WHERE hostel_id = ? AND response_date = ? AND {pass_column} IN ({placeholders}) AND {attended_column} = FALSE RETURNING {pass_column} AS pass, student_id", [hostel_id.upper(), report_date, *chunk]))
+        batch_ops.append(Statement(f"SELECT {pass_column} AS pass, student_id FROM meal_responses WHERE hostel_id = ? AND response_date = ? AND {pass_column} IN ({placeholders})", [hostel_id.upper(), report_date, *chunk]))
+    claimed, owners = {}, {}
+    if batch_ops:
+        async with get_db_connection(hostel_id) as conn:
+            result_sets = await conn.batch(batch_ops)
+        for claimed_rs, owners_rs in zip(result_sets[::2], result_sets[1::2]):
+            claimed.update((row['pass'], row['student_id']) for row in claimed_rs.rows)
+            owners.update((row['pass'], row['student_id']) for row in owners_rs.rows)
+
+    results = []
+    for full_pass in full_passes:
+        if full_pass in claimed:
+            student_id = claimed.pop(full_pass)
+            results.append((full_pass, f"Pass Verified for {student_id}", student_id))
+        elif full_pass in owners:
+            results.append((full_pass, f"Pass already used by {owners[full_pass]}", None))
+        else:
+            results.append((full_pass, "Invalid Pass Code", None))
+    return results
+
+# --- Local pass verification with write-behind attendance ---
+ATTENDANCE_FLUSH_INTERVAL = float(get_setting("ATTENDANCE_FLUSH_INTERVAL", 2.0))
+
+_attendance = AttendanceBuffer()
+_attendance_flusher = None
+
+async def verify_pass_locally(hostel_id, meal_type, code):
+    """
+    Verifies a signed pass against the hostel key and this process's
+    used-pass set, without a database round trip once the key and the day's
+    used set are loaded. Accepted passes are written to meal_responses in
+    batches by a background flush, so the counter keeps working while the
+    database is unreachable. Returns (full_pass, message, student_id).
+
+    Counters in different processes each keep their own used set. A pass
+    accepted by two of them shows up as a late duplicate when flushed.
+    """
+    _, _, attended_column = _pass_columns(meal_type)
+    meal = meal_type.lower()
+    day = (datetime.now() + timedelta(days=1)).date().isoformat()
+    scope = (hostel_id.upper(), day, meal)
+    full_pass = full_pass_code(meal_type, code)
+    key = await get_pass_key(hostel_id)
+    if not _attendance.is_loaded(scope):
+        async with get_db_connection(hostel_id) as conn:
+            rs = await conn.execute(f'SELECT student_id FROM meal_responses WHERE hostel_id = ? AND response_date = ? AND {attended_column} = TRUE', [hostel_id.upper(), day])
+        _attendance.load(scope, [row['student_id'] for row in rs.rows])
+    _ensure_attendance_flusher()
+    student_id = passes.check_pass(key, hostel_id, day, meal, full_pass)
+    if student_id is None:
+        _attendance.reject()
+        return full_pass, "Invalid Pass Code", None
+    if not _attendance.claim(scope, student_id):
+        return full_pass, f"Pass already used by {student_id}", None
+    return full_pass, f"Pass Verified for {student_id}", student_id
+
+async def flush_attendance():
+    """
+    Writes every queued attendance mark, one UPDATE per hostel-day-meal. Marks
+    that fail to write are queued again. Returns the number of rows marked.
+    """
+    written = 0
+    for (hostel_id, day, meal), student_ids in _attendance.drain().items():
+        attended_column = f"{meal}_attended"
+        try:
+            batch_ops = [
+                Statement(
+                    f"UPDATE meal_responses SET {attended_column} = TRUE WHERE hostel_id = ? AND response_date = ? AND {attended_column} = FALSE "
+                    f"AND student_id IN ({', '.join(['?'] * len(chunk))}) RETURNING student_id",
+                    [hostel_id, day, *chunk]
+                )
+                for chunk in help.chunked(student_ids, MAX_ROWS_PER_STATEMENT)
+            ]
+            async with get_db_connection(hostel_id) as conn:
+                result_sets = await conn.batch(batch_ops)
+        except Exception:
+            _attendance.requeue((hostel_id, day, meal), student_ids)
+            continue
+        marked = sum(len(rs.rows) for rs in result_sets)
+        _attendance.record_flush(marked, len(student_ids) - marked)
+        written += marked
+    return written
+
+async def _flush_attendance_forever():
+    while True:
+        await asyncio.sleep(ATTENDANCE_FLUSH_INTERVAL)
+        await flush_attendance()
+
+def _ensure_attendance_flusher():
+    global _attendance_flusher
+    if _attendance_flusher is None or _attendance_flusher.done():
+        _attendance_flusher = asyncio.get_running_loop().create_task(_flush_attendance_forever(), context=contextvars.Context())
+
+def get_attendance_stats():
+    """Counts of accepted, rejected, flushed, pending and late-duplicate marks in this process."""
+    return _attendance.snapshot()
+
+async def refresh_meal_rollups(hostel_id):
+    """
+    Folds every closed day (through yesterday, once attendance is final) that
+    is not yet rolled up into the day/week/month rows of meal_rollups. Each
+    day's responses are aggregated exactly once; the watermark guard makes a
+    concurrent refresh add nothing. The scheduler refreshes at each cutoff;
+    readers only touch the database on their first call of a new day.
+    """
+    through = (datetime.now() - timedelta(days=1)).date().isoformat()
+    key = ("rollups", hostel_id.upper())
+    cached = _cache.get(key)
+    if cached is not MISSING and cached >= through:
+        return
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute('SELECT rolled_through FROM rollup_watermarks WHERE hostel_id = ?', [hostel_id.upper()])
+        since = rs.rows[0]['rolled_through'] if rs.rows else None
+        if since is not None and since >= through:
+            _cache.set(key, since, ROLLUP_WATERMARK_TTL)
+            return
+        await conn.batch([
+            Statement(
+                'INSERT INTO meal_rollups (hostel_id, period, period_start, days, total_students, responded, breakfast_opt_in, lunch_opt_in, dinner_opt_in, breakfast_attended, lunch_attended, dinner_attended) '
+                "SELECT s.hostel_id, p.period, CASE p.period WHEN 'day' THEN s.report_date WHEN 'week' THEN date(s.report_date, 'weekday 0', '-6 days') ELSE date(s.report_date, 'start of month') END, "
+                '1, s.total_students, s.responded_students, s.breakfast_opt_in, s.lunch_opt_in, s.dinner_opt_in, COALESCE(a.breakfast, 0), COALESCE(a.lunch, 0), COALESCE(a.dinner, 0) '
+                'FROM daily_summary s '
+                'LEFT JOIN (SELECT response_date, SUM(breakfast_attended) AS breakfast, SUM(lunch_attended) AS lunch, SUM(dinner_attended) AS dinner FROM meal_responses '
+                'WHERE hostel_id = ? AND response_date > ? AND response_date <= ? GROUP BY response_date) a ON a.response_date = s.report_date '
+                "CROSS JOIN (SELECT 'day' AS period UNION ALL SELECT 'week' UNION ALL SELECT 'month') p "
+                'WHERE s.hostel_id = ? AND s.report_date > ? AND s.report_date <= ? AND (SELECT rolled_through FROM rollup_watermarks WHERE hostel_id = ?) IS ? '
+                'ON CONFLICT (hostel_id, period, period_start) DO UPDATE SET days = days + excluded.days, total_students = total_students + excluded.total_students, '
+                'responded = responded + excluded.responded, breakfast_opt_in = breakfast_opt_in + excluded.breakfast_opt_in, lunch_opt_in = lunch_opt_in + excluded.lunch_opt_in, '
+                'dinner_opt_in = dinner_opt_in + excluded.dinner_opt_in, breakfast_attended = breakfast_attended + excluded.breakfast_attended, '
+                'lunch_attended = lunch_attended + excluded.lunch_attended, dinner_attended = dinner_attended + excluded.dinner_attended',
+                [hostel_id.upper(), since or '', through, hostel_id.upper(), since or '', through, hostel_id.upper(), since]
+            ),
+            Statement('INSERT INTO rollup_watermarks (hostel_id, rolled_through) VALUES (?, ?) ON CONFLICT (hostel_id) DO UPDATE SET rolled_through = excluded.rolled_through', [hostel_id.upper(), through])
+        ])
+    _cache.set(key, through, ROLLUP_WATERMARK_TTL)
+
+async def get_meal_history(hostel_id, period="week", limit=52):
+    """
+    The latest `limit` day, week or month rollups, oldest first, with opt-in,
+    response and attendance rates computed column-wise.
+    """
+    import numpy as np
+    import pandas as pd
+    await refresh_meal_rollups(hostel_id)
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute('SELECT * FROM meal_rollups WHERE hostel_id = ? AND period = ? ORDER BY period_start DESC LIMIT ?', [hostel_id.upper(), period, limit])
+    df = _to_frame(rs).iloc[::-1].reset_index(drop=True)
+    if df.empty:
+        return df
+    totals = df['total_students'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['response_rate'] = np.where(totals > 0, df['responded'] / totals, np.nan)
+        for meal in ("breakfast", "lunch", "dinner"):
+            opt_in = df[f'{meal}_opt_in'].to_numpy(dtype=float)
+            df[f'{meal}_opt_in_rate'] = np.where(totals > 0, opt_in / totals, np.nan)
+            df[f'{meal}_attendance_rate'] = np.where(opt_in > 0, df[f'{meal}_attended'] / opt_in, np.nan)
+    df['period_start'] = pd.to_datetime(df['period_start'])
+    return df
 
 async def add_bill(hostel_id, item_name, price):
-    async with get_db_connection() as conn:
+    async with get_db_connection(hostel_id) as conn:
         await conn.execute("INSERT INTO bills (hostel_id, item_name, price, purchase_date) VALUES (?, ?, ?, ?)",
                            [hostel_id.upper(), item_name, price, datetime.now().date().isoformat()])
+    _cache.invalidate_prefix(("bills", hostel_id.upper()))
+
+async def add_bills(hostel_id, bills):
+    """
+    Records many (item_name, price, purchase_date) bills in one chunked batch.
+    A missing purchase_date means today. Returns the number of bills added.
+    """
+    today = datetime.now().date().isoformat()
+    rows = [(hostel_id.upper(), item_name, price, purchase_date or today) for item_name, price, purchase_date in bills]
+    if not rows:
+        return 0
+    batch_ops = []
+    for chunk in help.chunked(rows, MAX_ROWS_PER_STATEMENT):
+        placeholders = ', '.join(['(?, ?, ?, ?)'] * len(chunk))
+        batch_ops.append(Statement(f"INSERT INTO bills (hostel_id, item_name, price, purchase_date) VALUES {placeholders}", [value for row in chunk for value in row]))
+    async with get_db_connection(hostel_id) as conn:
+        await conn.batch(batch_ops)
+    _cache.invalidate_prefix(("bills", hostel_id.upper()))
+    return len(rows)
+
+def _bill_filters(hostel_id, start_date, end_date, item_query):
+    clauses, args = ["hostel_id = ?"], [hostel_id.upper()]
+    if start_date:
+        clauses.append("purchase_date >= ?")
+        args.append(str(start_date))
+    if end_date:
+        clauses.append("purchase_date <= ?")
+        args.append(str(end_date))
+    if item_query:
+        clauses.append("item_name LIKE ? ESCAPE '\\'")
+        escaped = item_query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        args.append(f"%{escaped}%")
+    return " AND ".join(clauses), args
+
+def _bills_page_statement(hostel_id, start_date, end_date, item_query, after, page_size):
+    where, args = _bill_filters(hostel_id, start_date, end_date, item_query)
+    if after:
+        where += " AND (purchase_date, id) < (?, ?)"
+        args.extend(after)
+    return Statement(f"SELECT id, item_name, price, purchase_date FROM bills WHERE {where} ORDER BY purchase_date DESC, id DESC LIMIT ?", [*args, page_size + 1])
+
+def _bills_page_from(rs, page_size):
+    import pandas as pd
+    rows = rs.rows[:page_size]
+    next_cursor = (rows[-1]['purchase_date'], rows[-1]['id']) if len(rs.rows) > page_size else None
+    page_df = pd.DataFrame([row.astuple() for row in rows], columns=rs.columns)
+    return page_df.drop(columns='id'), next_cursor
+
+async def get_bills_page(hostel_id, start_date=None, end_date=None, item_query=None, after=None, page_size=BILLS_PAGE_SIZE):
+    """
+    One page of bills, newest first, using keyset pagination on
+    (purchase_date, id) so deep pages cost the same as the first. Pass the
+    returned cursor as `after` for the next page; it is None on the last page.
+    """
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute(_bills_page_statement(hostel_id, start_date, end_date, item_query, after, page_size))
+    return _bills_page_from(rs, page_size)
+
+def _bill_totals_statements(hostel_id, start_date, end_date, item_query):
+    """The cache key and cached totals (or MISSING), plus the statements that read them when missing."""
+    where, args = _bill_filters(hostel_id, start_date, end_date, item_query)
+    key = ("bills", hostel_id.upper(), "totals", *args[1:])
+    totals = _cache.get(key)
+    if totals is not MISSING:
+        return key, totals, []
+    return key, totals, [
+        Statement(f"SELECT COUNT(*) AS bills, COALESCE(SUM(price), 0) AS total FROM bills WHERE {where}", args),
+        Statement(f"SELECT substr(purchase_date, 1, 7) AS month, COUNT(*) AS bills, SUM(price) AS total FROM bills WHERE {where} GROUP BY month ORDER BY month", args),
+        Statement(f"SELECT item_name, COUNT(*) AS bills, SUM(price) AS total FROM bills WHERE {where} GROUP BY item_name ORDER BY total DESC", args)
+    ]
+
+def _bill_totals_from(key, totals, result_sets):
+    if totals is MISSING:
+        overall_rs, monthly_rs, items_rs = result_sets
+        totals = {
+            "bills": overall_rs.rows[0]['bills'],
+            "total": overall_rs.rows[0]['total'],
+            "monthly": _to_frame(monthly_rs),
+            "items": _to_frame(items_rs),
+        }
+        _cache.set(key, totals, BILLS_TTL)
+    return {**totals, "monthly": totals["monthly"].copy(), "items": totals["items"].copy()}
+
+async def get_bill_totals(hostel_id, start_date=None, end_date=None, item_query=None):
+    """
+    Spending aggregated in SQL: overall, per month and per item, for the same
+    filters as get_bills_page. Served from the covering bills index.
+    """
+    key, totals, statements = _bill_totals_statements(hostel_id, start_date, end_date, item_query)
+    if statements:
+        async with get_db_connection(hostel_id) as conn:
+            result_sets = await conn.batch(statements)
+    return _bill_totals_from(key, totals, result_sets if statements else [])
+
+# --- Streaming exports ---
+EXPORT_CHUNK_ROWS = 5000
+
+# dataset -> (table, date column, tiebreak column, [(column, type)], extra filter)
+# Each dataset pages on (date column, tiebreak column), which must be unique per hostel.
+EXPORT_DATASETS = {
+    "responses": ("meal_responses", "response_date", "student_id", [
+        ("student_id", "string"), ("response_date", "string"),
+        ("breakfast", "bool"), ("lunch", "bool"), ("dinner", "bool"), ("submitted_at", "string"),
+    ], None),
+    "attendance": ("meal_responses", "response_date", "student_id", [
+        ("student_id", "string"), ("response_date", "string"),
+        ("breakfast_pass", "string"), ("breakfast_attended", "bool"),
+        ("lunch_pass", "string"), ("lunch_attended", "bool"),
+        ("dinner_pass", "string"), ("dinner_attended", "bool"),
+    ], "(breakfast_pass IS NOT NULL OR lunch_pass IS NOT NULL OR dinner_pass IS NOT NULL)"),
+    "bills": ("bills", "purchase_date", "id", [
+        ("purchase_date", "string"), ("item_name", "string"), ("price", "double"),
+    ], None),
+}
+
+async def iter_export_chunks(hostel_id, dataset, start_date, end_date, chunk_size=EXPORT_CHUNK_ROWS):
+    """
+    Yields a dataset's rows for a hostel and inclusive date range as lists of
+    tuples, at most `chunk_size` per query. Pages by keyset, so every chunk is
+    an index range scan and only one chunk is ever held in memory.
+    """
+    from . import archive
+    table, date_column, tiebreak, columns, extra = EXPORT_DATASETS[dataset]
+    names = [name for name, _ in columns]
+    bool_idxs = [i for i, (_, kind) in enumerate(columns) if kind == "bool"]
+    if table == "meal_responses":
+        # Archived months are older than any live row, so they come first.
+        start, end = date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date))
+        for month in archive.months_between(start, end):
+            frame = await asyncio.to_thread(archive.read_month, hostel_id, month, start, end)
+            if frame is None:
+                continue
+            if extra:
+                frame = frame[frame[['breakfast_pass', 'lunch_pass', 'dinner_pass']].notna().any(axis=1)]
+            rows = list(zip(*(frame[name].tolist() for name in names)))
+            for chunk in help.chunked(rows, chunk_size):
+                yield [list(row) for row in chunk]
+    where = f"hostel_id = ? AND {date_column} >= ? AND {date_column} <= ?" + (f" AND {extra}" if extra else "")
+    base_args = [hostel_id.upper(), str(start_date), str(end_date)]
+    cursor = None
+    while True:
+        sql = f"SELECT {', '.join(names)}, {date_column}, {tiebreak} FROM {table} WHERE {where}"
+        args = list(base_args)
+        if cursor:
+            sql += f" AND ({date_column}, {tiebreak}) > (?, ?)"
+            args.extend(cursor)
+        async with get_db_connection(hostel_id) as conn:
+            rs = await conn.execute(f"{sql} ORDER BY {date_column}, {tiebreak} LIMIT ?", [*args, chunk_size])
+        if not rs.rows:
+            return
+        rows = [row.astuple() for row in rs.rows]
+        cursor = rows[-1][-2:]
+        chunk = [list(row[:-2]) for row in rows]
+        for row in chunk:
+            for i in bool_idxs:
+                if row[i] is not None:
+                    row[i] = bool(row[i])
+        yield chunk
+        if len(rows) < chunk_size:
+            return
+
+async def write_export(hostel_id, dataset, start_date, end_date, fmt, out, chunk_size=EXPORT_CHUNK_ROWS):
+    """
+    Streams a dataset into the binary file `out` as CSV, gzipped CSV or
+    Parquet. Encoding and compression run off the event loop. Returns the
+    number of rows written.
+    """
+    columns = EXPORT_DATASETS[dataset][3]
+    writer = exports.open_writer(out, fmt, [name for name, _ in columns], [kind for _, kind in columns])
+    written = 0
+    try:
+        async for chunk in iter_export_chunks(hostel_id, dataset, start_date, end_date, chunk_size):
+            await asyncio.to_thread(writer.write, chunk)
+            written += len(chunk)
+    finally:
+        await asyncio.to_thread(writer.close)
+    return written
+
+# --- Archival of old responses ---
+# The live table keeps at least the forecast's lookback window.
+ARCHIVE_RETAIN_DAYS = int(get_setting("ARCHIVE_RETAIN_DAYS", 180))
+
+async def get_hostel_ids():
+    """Every hostel on every shard, queried concurrently."""
+    async def hostel_ids(conn):
+        return await conn.execute('SELECT hostel_id FROM hostels')
+    return _merge_hostel_ids(await fan_out(hostel_ids))
+
+async def archive_meal_responses(hostel_id, retain_days=ARCHIVE_RETAIN_DAYS):
+    """
+    Moves whole months of a hostel's meal_responses older than `retain_days`
+    into archive files, then deletes them from the table. A month is archived
+    only if daily_summary covers every day that has responses and the rollups
+    already include it. Before deleting, the written file is read back and its
+    totals compared with the rows. Returns {month: outcome}.
+    """
+    from . import forecast
+    if retain_days <= forecast.LOOKBACK_DAYS:
+        raise ValueError(f"retain_days must exceed the forecast lookback of {forecast.LOOKBACK_DAYS} days.")
+    await refresh_meal_rollups(hostel_id)
+    boundary = (datetime.now().date() - timedelta(days=retain_days)).replace(day=1).isoformat()
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute(
+            'SELECT substr(m.response_date, 1, 7) AS month, COUNT(DISTINCT m.response_date) AS days, COUNT(DISTINCT s.report_date) AS covered, '
+            "MAX(m.response_date) <= COALESCE((SELECT rolled_through FROM rollup_watermarks WHERE hostel_id = ?), '') AS rolled "
+            'FROM meal_responses m LEFT JOIN daily_summary s ON s.hostel_id = m.hostel_id AND s.report_date = m.response_date '
+            'WHERE m.hostel_id = ? AND m.response_date < ? GROUP BY month ORDER BY month',
+            [hostel_id.upper(), hostel_id.upper(), boundary]
+        )
+    outcomes = {}
+    for row in rs.rows:
+        if row['covered'] < row['days']:
+            outcomes[row['month']] = f"skipped: {row['days'] - row['covered']} days have no daily_summary"
+        elif not row['rolled']:
+            outcomes[row['month']] = "skipped: not rolled up yet"
+        else:
+            outcomes[row['month']] = await _archive_month(hostel_id, row['month'])
+    return outcomes
+
+async def _archive_month(hostel_id, month):
+    from . import archive
+    first_day, last_day = f"{month}-01", f"{month}-31"
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute(
+            f"SELECT id, {', '.join(archive.COLUMNS)} FROM meal_responses WHERE hostel_id = ? AND response_date >= ? AND response_date <= ?",
+            [hostel_id.upper(), first_day, last_day]
+        )
+    if not rs.rows:
+        return "nothing to archive"
+    max_id = max(row['id'] for row in rs.rows)
+    rows = {(row['student_id'], row['response_date']): row.astuple()[1:] for row in rs.rows}
+    # A file left by an earlier run that stopped before deleting is merged, not duplicated.
+    path = archive.archive_path(hostel_id, month)
+    if os.path.exists(path):
+        existing = await asyncio.to_thread(archive.read_month, hostel_id, month)
+        for values in zip(*(existing[name].tolist() for name in archive.COLUMNS)):
+            rows.setdefault((values[0], values[1]), values)
+    rows = list(rows.values())
+    await asyncio.to_thread(archive.write_archive, path, hostel_id, month, rows)
+    written = await asyncio.to_thread(archive.read_month, hostel_id, month)
+    if archive.totals(list(zip(*(written[name].tolist() for name in archive.COLUMNS)))) != archive.totals(rows):
+        raise RuntimeError(f"Archive {path} does not match the rows it was written from; nothing was deleted.")
+    async with get_db_connection(hostel_id) as conn:
+        await conn.batch([
+            Statement('DELETE FROM meal_responses WHERE hostel_id = ? AND response_date >= ? AND response_date <= ? AND id <= ?', [hostel_id.upper(), first_day, last_day, max_id]),
+            Statement('DELETE FROM meal_counters WHERE hostel_id = ? AND counter_date >= ? AND counter_date <= ?', [hostel_id.upper(), first_day, last_day])
+        ])
+    return f"archived {len(rs.rows)} rows"
+
+async def get_archived_responses(hostel_id, start_date, end_date, columns=None):
+    """Archived meal_responses rows for an inclusive date range, read from the memory-mapped month files."""
+    import pandas as pd
+    from . import archive
+    columns = columns or archive.COLUMNS
+    frames = []
+    for month in archive.months_between(start_date, end_date):
+        frame = await asyncio.to_thread(archive.read_month, hostel_id, month, start_date, end_date, columns)
+        if frame is not None:
+            frames.append(frame)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=list(columns))
+
+STUDENT_HISTORY_COLUMNS = ("student_id", "response_date", "breakfast", "lunch", "dinner", "breakfast_attended", "lunch_attended", "dinner_attended")
+
+async def get_student_history(hostel_id, student_id, start_date, end_date):
+    """
+    One student's responses, opt-ins and attendance per month over an
+    inclusive date range. Archived months are read from their memory-mapped
+    files and the rest from meal_responses.
+    """
+    import pandas as pd
+    async with get_db_connection(hostel_id) as conn:
+        rs = await conn.execute(
+            f"SELECT {', '.join(STUDENT_HISTORY_COLUMNS)} FROM meal_responses WHERE hostel_id = ? AND student_id = ? AND response_date >= ? AND response_date <= ?",
+            [hostel_id.upper(), student_id.upper(), start_date.isoformat(), end_date.isoformat()]
+        )
+    archived = await get_archived_responses(hostel_id, start_date, end_date, STUDENT_HISTORY_COLUMNS)
+    frames = [frame for frame in (archived[archived['student_id'] == student_id.upper()], _to_frame(rs)) if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=["month", "days", "breakfast", "lunch", "dinner", "breakfast_attended", "lunch_attended", "dinner_attended"])
+    # A month archived by an interrupted run can still have live rows; those win.
+    df = pd.concat(frames, ignore_index=True).drop_duplicates("response_date", keep="last")
+    meals = list(STUDENT_HISTORY_COLUMNS[2:])
+    df[meals] = df[meals].fillna(False).astype(bool)
+    df['month'] = pd.to_datetime(df['response_date']).dt.to_period('M').dt.to_timestamp()
+    monthly = df.groupby('month')[meals].sum()
+    monthly.insert(0, 'days', df.groupby('month').size())
+    return monthly.reset_index()
 
-async def get_bills(hostel_id):
-    async with get_db_connection() as conn:
-        rs = await conn.execute("SELECT item_name, price, purchase_date FROM bills WHERE hostel_id = ? ORDER BY purchase_date DESC", [hostel_id.upper()])
-        return pd.DataFrame(rs.rows, columns=rs.columns)
\ No newline at end of file
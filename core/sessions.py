@@ -0,0 +1,44 @@
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from .config import get_setting
+
+SESSION_TTL_SECONDS = 12 * 60 * 60
+
+_fallback_secret = secrets.token_bytes(32)
+
+def _secret():
+    # Without SESSION_SECRET, tokens are only valid for this process's lifetime.
+    secret = get_setting("SESSION_SECRET")
+    return secret.encode() if secret else _fallback_secret
+
+def _sign(payload):
+    return hmac.new(_secret(), payload, hashlib.sha256).digest()
+
+def create_session_token(hostel_id, user_id, role, ttl=SESSION_TTL_SECONDS):
+    """
+    Issues a signed token after a successful login. Pages check it instead of
+    re-reading users or re-verifying the password hash on every rerun.
+    """
+    claims = {"hostel_id": hostel_id.upper(), "user_id": user_id.upper(), "role": role, "exp": int(time.time()) + ttl}
+    payload = base64.urlsafe_b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    signature = base64.urlsafe_b64encode(_sign(payload))
+    return f"{payload.decode()}.{signature.decode()}"
+
+def read_session_token(token):
+    """Returns the token's claims, or None if it is missing, tampered with or expired."""
+    if not token or "." not in token:
+        return None
+    payload, signature = token.encode().split(b".", 1)
+    try:
+        if not hmac.compare_digest(base64.urlsafe_b64decode(signature), _sign(payload)):
+            return None
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
@@ -0,0 +1,147 @@
+"""
+Lists shards and moves a hostel's rows from one shard to another.
+
+    python -m core.shards list
+    python -m core.shards move NORT1234 b          # wait out routers' catalog caches first
+    python -m core.shards move NORT1234 b --no-wait  # when no app process is running
+
+A move marks the hostel as moving in the catalog, so routers stop serving
+it, then waits SHARD_CATALOG_TTL for cached assignments to expire. It copies
+every tenant table to the target, compares row counts, points the catalog
+at the target, and only then deletes the source rows. A failed move puts
+the hostel back on its source shard; rerunning it clears whatever the
+failed attempt left on the target first.
+"""
+import argparse
+import asyncio
+import json
+from libsql_client import Statement
+from .database import MAIN_SHARD, SHARD_CATALOG_TTL, forget_assignment, get_db_connection, shard_names
+
+# Tables holding one hostel's rows -> whether their AUTOINCREMENT id is
+# dropped on copy, so the target assigns ids that cannot collide with its own.
+TENANT_TABLES = {
+    "hostels": False,
+    "users": True,
+    "meal_responses": True,
+    # Copied after meal_responses, replacing the events its triggers wrote on the target.
+    "meal_event_versions": False,
+    "meal_response_events": True,
+    "daily_summary": True,
+    "bills": True,
+    "meal_rollups": False,
+    "rollup_watermarks": False,
+    "meal_preferences": False,
+    "pass_keys": False,
+}
+# Rebuilt on the target by the meal_responses insert trigger; deleted with the source rows.
+DERIVED_TABLES = ("meal_counters",)
+COPY_CHUNK_ROWS = 1000
+ROWS_PER_STATEMENT = 100
+
+def _delete_statements(hostel_id):
+    return [Statement(f'DELETE FROM {table} WHERE hostel_id = ?', [hostel_id]) for table in (*TENANT_TABLES, *DERIVED_TABLES)]
+
+async def _set_catalog(hostel_id, shard, state):
+    async with get_db_connection(shard=MAIN_SHARD) as conn:
+        await conn.execute(
+            'INSERT INTO hostel_shards (hostel_id, shard, state) VALUES (?, ?, ?) '
+            'ON CONFLICT (hostel_id) DO UPDATE SET shard = excluded.shard, state = excluded.state, updated_at = CURRENT_TIMESTAMP',
+            [hostel_id, shard, state]
+        )
+    forget_assignment(hostel_id)
+
+async def _current_shard(hostel_id):
+    async with get_db_connection(shard=MAIN_SHARD) as conn:
+        rs = await conn.execute('SELECT shard FROM hostel_shards WHERE hostel_id = ?', [hostel_id])
+    return rs.rows[0]['shard'] if rs.rows else MAIN_SHARD
+
+async def _copy_table(hostel_id, table, drop_id, source, target):
+    async with get_db_connection(shard=target) as conn:
+        await conn.execute(f'DELETE FROM {table} WHERE hostel_id = ?', [hostel_id])
+    copied, last_rowid = 0, 0
+    while True:
+        async with get_db_connection(shard=source) as conn:
+            rs = await conn.execute(f'SELECT rowid AS _rowid, * FROM {table} WHERE hostel_id = ? AND rowid > ? ORDER BY rowid LIMIT ?', [hostel_id, last_rowid, COPY_CHUNK_ROWS])
+        if not rs.rows:
+            return copied
+        skip = {"_rowid", "id"} if drop_id else {"_rowid"}
+        idxs = [i for i, column in enumerate(rs.columns) if column not in skip]
+        columns = ", ".join(rs.columns[i] for i in idxs)
+        rows = [row.astuple() for row in rs.rows]
+        statements = []
+        for start in range(0, len(rows), ROWS_PER_STATEMENT):
+            chunk = rows[start:start + ROWS_PER_STATEMENT]
+            placeholders = ", ".join(["(" + ", ".join(["?"] * len(idxs)) + ")"] * len(chunk))
+            statements.append(Statement(f'INSERT INTO {table} ({columns}) VALUES {placeholders}', [row[i] for row in chunk for i in idxs]))
+        async with get_db_connection(shard=target) as conn:
+            await conn.batch(statements)
+        copied += len(rows)
+        last_rowid = rows[-1][0]
+
+async def _counts(hostel_id, shard):
+    statements = [Statement(f'SELECT COUNT(*) AS n FROM {table} WHERE hostel_id = ?', [hostel_id]) for table in TENANT_TABLES]
+    # Counters are compared by totals: the source may keep emptied rows the trigger never recreates.
+    statements.append(Statement('SELECT COALESCE(SUM(responded), 0), COALESCE(SUM(breakfast), 0), COALESCE(SUM(lunch), 0), COALESCE(SUM(dinner), 0) FROM meal_counters WHERE hostel_id = ?', [hostel_id]))
+    async with get_db_connection(shard=shard) as conn:
+        result_sets = await conn.batch(statements)
+    return {table: result_sets[i].rows[0].astuple() for i, table in enumerate((*TENANT_TABLES, *DERIVED_TABLES))}
+
+async def move_hostel(hostel_id, target, wait=SHARD_CATALOG_TTL):
+    """Moves a hostel to the `target` shard and returns a report of what was copied."""
+    hostel_id = hostel_id.upper()
+    if target not in shard_names():
+        raise ValueError(f"Unknown shard: {target}")
+    source = await _current_shard(hostel_id)
+    if source == target:
+        await _set_catalog(hostel_id, source, 'active')
+        return {"hostel_id": hostel_id, "shard": target, "status": "already there"}
+
+    await _set_catalog(hostel_id, source, 'moving')
+    try:
+        # Routers cached the old assignment for at most one TTL; after that they see 'moving'.
+        await asyncio.sleep(wait)
+        async with get_db_connection(shard=target) as conn:
+            await conn.batch(_delete_statements(hostel_id))
+        copied = {table: await _copy_table(hostel_id, table, drop_id, source, target) for table, drop_id in TENANT_TABLES.items()}
+        source_counts, target_counts = await _counts(hostel_id, source), await _counts(hostel_id, target)
+        if source_counts != target_counts:
+            raise RuntimeError(f"Copy of {hostel_id} to {target} does not match {source}: {source_counts} != {target_counts}")
+    except BaseException:
+        await _set_catalog(hostel_id, source, 'active')
+        raise
+    await _set_catalog(hostel_id, target, 'active')
+    async with get_db_connection(shard=source) as conn:
+        await conn.batch(_delete_statements(hostel_id))
+    return {"hostel_id": hostel_id, "from": source, "to": target, "status": "moved", "rows": copied}
+
+async def list_shards():
+    """Hostels per shard according to the catalog."""
+    async with get_db_connection(shard=MAIN_SHARD) as conn:
+        rs = await conn.execute('SELECT shard, state, COUNT(*) AS hostels FROM hostel_shards GROUP BY shard, state')
+    report = {shard: {"active": 0, "moving": 0} for shard in shard_names()}
+    for row in rs.rows:
+        report.setdefault(row['shard'], {"active": 0, "moving": 0})[row['state']] = row['hostels']
+    return report
+
+def main(argv=None):
+    from . import services as serv
+    from utils import helpers as help
+    parser = argparse.ArgumentParser(description="Inspect shards and move hostels between them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="hostels per shard")
+    move = commands.add_parser("move", help="move a hostel's rows to another shard")
+    move.add_argument("hostel_id")
+    move.add_argument("target", help="shard name, as in DB_SHARDS, or main")
+    move.add_argument("--no-wait", action="store_true", help="skip waiting for routers' catalog caches to expire")
+    args = parser.parse_args(argv)
+
+    help.run_async(serv.setup_database())
+    if args.command == "list":
+        report = help.run_async(list_shards())
+    else:
+        report = help.run_async(move_hostel(args.hostel_id, args.target, wait=0 if args.no_wait else SHARD_CATALOG_TTL))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import sqlite3
+from libsql_client import Client, LibsqlError, ResultSet, Row, Statement
+
+# Tuned for a single-site deployment: WAL lets readers run alongside the
+# writer, and NORMAL sync is durable across application crashes.
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA busy_timeout = 5000",
+]
+
+class LocalSQLiteClient(Client):
+    """
+    A libsql_client-compatible client over one persistent local SQLite
+    connection. Statements run inline on the event loop; each call completes
+    without yielding, so concurrent coroutines never interleave inside a batch.
+    Compiled statements are reused through sqlite3's statement cache.
+    """
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, cached_statements=512)
+        for pragma in PRAGMAS:
+            self._db.execute(pragma)
+
+    async def execute(self, stmt, args=None):
+        return self._execute(Statement.convert(stmt, args))
+
+    async def batch(self, stmts):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            result_sets = [self._execute(Statement.convert(stmt)) for stmt in stmts]
+            self._db.execute("COMMIT")
+        except BaseException:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            raise
+        return result_sets
+
+    def transaction(self):
+        raise LibsqlError("The local SQLite backend supports batches, not interactive transactions.", "TRANSACTIONS_NOT_SUPPORTED")
+
+    async def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    @property
+    def closed(self):
+        return self._db is None
+
+    def _execute(self, stmt):
+        if self._db is None:
+            raise LibsqlError("The client was closed", "CLIENT_CLOSED")
+        try:
+            cursor = self._db.execute(stmt.sql, stmt.args or ())
+            values = cursor.fetchall()
+        except sqlite3.Error as e:
+            raise LibsqlError(str(e), getattr(e, "sqlite_errorname", "SQLITE")) from e
+        columns = tuple(desc[0] for desc in cursor.description or ())
+        column_idxs = {column: idx for idx, column in enumerate(columns)}
+        rows = [Row(column_idxs, row) for row in values]
+        return ResultSet(columns, rows, max(cursor.rowcount, 0), cursor.lastrowid)
+
+class LocalBackend:
+    """Hands every caller the same local client; there is no network to pool."""
+    def __init__(self, path):
+        self._path = path
+        self._client = None
+
+    async def acquire(self):
+        if self._client is None or self._client.closed:
+            self._client = LocalSQLiteClient(self._path)
+        return self._client
+
+    async def release(self, client, broken=False):
+        pass
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
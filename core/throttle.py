@@ -0,0 +1,185 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+HOSTEL_WIDE = ""  # user_id of a hostel's shared bucket
+
+class LoginThrottled(RuntimeError):
+    """Raised instead of checking a password while the hostel or user is throttled."""
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Too many login attempts; try again in {math.ceil(retry_after)} s")
+
+class LoginThrottle:
+    """
+    Process-wide token buckets for login attempts, checked in memory before
+    any database query or bcrypt hash. Each attempt reserves a token from the
+    user's bucket, and each password check that runs reserves one from the
+    hostel's bucket. Both are refunded on success, so only failures pay: real
+    logins never drain either bucket, and guessed user IDs never reach a
+    password check, so they cannot drain the hostel's.
+
+    Each user also has a failure streak. Past free_failures, every failure
+    blocks the user for backoff_base * 2 ** excess seconds, capped at
+    backoff_max, so keeping a student out costs a stranger one wrong guess
+    per backoff_max. A streak ends on success, or once its block has expired
+    and the user has been quiet for backoff_max.
+
+    Buckets are exchanged with other processes through the login_throttle
+    table by services.sync_login_throttle: each sync adds this process's
+    spending and failures and takes back the shared token level, failure
+    count and block. Buckets are capped at max_keys, evicting the least
+    recently used.
+    """
+    def __init__(self, user_burst, user_per_minute, hostel_burst, hostel_per_minute, free_failures, backoff_base, backoff_max, max_keys=100000):
+        self._lock = threading.Lock()
+        self._limits = {True: (user_burst, user_per_minute / 60), False: (hostel_burst, hostel_per_minute / 60)}
+        self.free_failures = free_failures
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._max_keys = max_keys
+        self._buckets = OrderedDict()  # (hostel_id, user_id) -> tokens, failure streak and unsynced deltas
+        self.stats = {"allowed": 0, "throttled": 0, "blocked": 0, "failures": 0, "synced": 0, "sync_failures": 0}
+
+    def limit(self, key):
+        """The (burst, tokens per second) of a key's bucket."""
+        return self._limits[key[1] != HOSTEL_WIDE]
+
+    def _bucket(self, key, now):
+        bucket = self._buckets.get(key)
+        burst, rate = self.limit(key)
+        if bucket is None:
+            bucket = self._buckets[key] = {"tokens": burst, "updated": now, "failures": 0, "blocked_until": 0.0, "last_failure": 0.0,
+                                           "spent": 0, "new_failures": 0, "rejected": 0, "reset": False}
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            bucket["tokens"] = min(burst, bucket["tokens"] + (now - bucket["updated"]) * rate)
+            bucket["updated"] = now
+            self._buckets.move_to_end(key)
+            if bucket["failures"] and bucket["blocked_until"] <= now and now - bucket["last_failure"] >= self.backoff_max:
+                bucket["failures"] = 0
+        return bucket
+
+    def _is_dirty(self, bucket):
+        return bucket["spent"] or bucket["new_failures"] or bucket["rejected"] or bucket["reset"]
+
+    def _reject(self, bucket, stat, retry_after):
+        bucket["rejected"] += 1
+        self.stats[stat] += 1
+        raise LoginThrottled(retry_after)
+
+    def _refund(self, key, bucket):
+        bucket["tokens"] = min(self.limit(key)[0], bucket["tokens"] + 1)
+        bucket["spent"] -= 1
+
+    def acquire(self, hostel_id, user_id, now=None):
+        """
+        Reserves a user token for one attempt, or raises LoginThrottled with
+        how long to wait. An empty hostel bucket refuses the attempt here too,
+        before its query, but is only charged by charge_hostel.
+        """
+        now = time.time() if now is None else now
+        hostel_key, user_key = (hostel_id, HOSTEL_WIDE), (hostel_id, user_id)
+        with self._lock:
+            hostel, user = self._bucket(hostel_key, now), self._bucket(user_key, now)
+            if user["blocked_until"] > now:
+                self._reject(user, "blocked", user["blocked_until"] - now)
+            for key, bucket in ((user_key, user), (hostel_key, hostel)):
+                if bucket["tokens"] < 1:
+                    self._reject(bucket, "throttled", (1 - bucket["tokens"]) / self.limit(key)[1])
+            user["tokens"] -= 1
+            user["spent"] += 1
+            self.stats["allowed"] += 1
+
+    def charge_hostel(self, hostel_id, now=None):
+        """Reserves a hostel token for a password check about to run, or raises LoginThrottled."""
+        now = time.time() if now is None else now
+        key = (hostel_id, HOSTEL_WIDE)
+        with self._lock:
+            hostel = self._bucket(key, now)
+            if hostel["tokens"] < 1:
+                self._reject(hostel, "throttled", (1 - hostel["tokens"]) / self.limit(key)[1])
+            hostel["tokens"] -= 1
+            hostel["spent"] += 1
+
+    def record(self, hostel_id, user_id, success, checked=False, now=None):
+        """
+        Ends the user's failure streak on success and refunds the tokens the
+        attempt reserved; otherwise extends the streak and blocks the user
+        once it is long enough. `checked` says whether charge_hostel was called.
+        """
+        now = time.time() if now is None else now
+        user_key = (hostel_id, user_id)
+        with self._lock:
+            user = self._bucket(user_key, now)
+            if success:
+                self._refund(user_key, user)
+                user.update(failures=0, blocked_until=0.0, new_failures=0, reset=True)
+                if checked:
+                    hostel_key = (hostel_id, HOSTEL_WIDE)
+                    self._refund(hostel_key, self._bucket(hostel_key, now))
+                return
+            user["new_failures"] += 1
+            user["failures"] += 1
+            user["last_failure"] = now
+            self.stats["failures"] += 1
+            excess = user["failures"] - self.free_failures
+            if excess >= 0:
+                # The exponent is capped so a long streak cannot overflow the float.
+                user["blocked_until"] = max(user["blocked_until"], now + min(self.backoff_max, self.backoff_base * 2 ** min(excess, 32)))
+
+    def drain(self, now=None):
+        """
+        Takes every bucket's unsynced changes, as {key: (spent, failures,
+        reset, blocked_until, rejected)}. Forgets full buckets with no streak;
+        the shared level is taken back on the key's next sync.
+        """
+        now = time.time() if now is None else now
+        changes = {}
+        with self._lock:
+            for key in list(self._buckets):
+                bucket = self._bucket(key, now)
+                if self._is_dirty(bucket):
+                    changes[key] = (bucket["spent"], bucket["new_failures"], bucket["reset"], bucket["blocked_until"], bucket["rejected"])
+                    bucket.update(spent=0, new_failures=0, rejected=0, reset=False)
+                elif bucket["tokens"] >= self.limit(key)[0] and not bucket["failures"] and bucket["blocked_until"] <= now:
+                    del self._buckets[key]
+        return changes
+
+    def requeue(self, changes):
+        """Puts back changes a failed sync did not write."""
+        with self._lock:
+            for key, (spent, failures, reset, _, rejected) in changes.items():
+                bucket = self._bucket(key, time.time())
+                bucket["spent"] += spent
+                bucket["rejected"] += rejected
+                # A success since the drain makes the earlier failures moot.
+                if not bucket["reset"]:
+                    bucket["new_failures"] += failures
+                    bucket["reset"] = reset
+            self.stats["sync_failures"] += 1
+
+    def merge(self, key, tokens, failures, blocked_until):
+        """
+        Applies a key's shared state, which already includes what this process
+        just sent: the bucket takes the shared token level, less anything spent
+        since the drain, and the longer failure streak and block.
+        """
+        now = time.time()
+        with self._lock:
+            bucket = self._bucket(key, now)
+            bucket["tokens"] = min(self.limit(key)[0], tokens - bucket["spent"])
+            # A success since the drain ends the streak the shared row still holds.
+            if not bucket["reset"]:
+                if failures > bucket["failures"]:
+                    bucket.update(failures=failures, last_failure=now)
+                bucket["blocked_until"] = max(bucket["blocked_until"], blocked_until)
+            self.stats["synced"] += 1
+
+    def snapshot(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            return {**self.stats, "tracked": len(self._buckets),
+                    "blocked_users": sum(1 for bucket in self._buckets.values() if bucket["blocked_until"] > now)}
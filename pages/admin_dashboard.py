@@ -1,94 +1,99 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, time
+import os
+import tempfile
+from datetime import datetime, timedelta
 from core import services as serv
+from core import sessions
+from core import metrics
+from core.exports import FORMATS
 from utils import helpers as help
+from utils.bootstrap import bootstrap_page, run_async
 
-st.set_page_config(page_title="Admin Dashboard", page_icon="⚙️", layout="wide")
-
-def load_css():
-    st.markdown("""
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap');
-            @import url('https://fonts.googleapis.com/icon?family=Material+Icons');
-            html, body, [class*="st-"], [class*="css-"] { font-family: 'Inter', sans-serif; }
-            
-            /* Fix for icon rendering issues */
-            .stButton > button {
-                font-family: 'Inter', sans-serif;
-            }
-            
-            /* Ensure emoji icons render properly */
-            .stMarkdown {
-                font-family: 'Inter', sans-serif;
-            }
-            
-            /* Sidebar styling */
-            .css-1d391kg {
-                font-family: 'Inter', sans-serif;
-            }
-            
-            /* Fix Material Icons in sidebar */
-            .material-icons {
-                font-family: 'Material Icons';
-                font-weight: normal;
-                font-style: normal;
-                font-size: 24px;
-                line-height: 1;
-                letter-spacing: normal;
-                text-transform: none;
-                display: inline-block;
-                white-space: nowrap;
-                word-wrap: normal;
-                direction: ltr;
-                -webkit-font-feature-settings: 'liga';
-                -webkit-font-smoothing: antialiased;
-            }
-            
-            /* Override any broken icon display */
-            [class*="css-"] .material-icons {
-                font-family: 'Material Icons' !important;
-            }
-        </style>
-    """, unsafe_allow_html=True)
-
-load_css()
-
-if not st.session_state.get("logged_in") or st.session_state.get("role") != 'admin':
-    st.error("You must be an admin to access this page.")
-    st.page_link("app.py", label="Go to Login", icon="🏠")
-    st.stop()
-
-# Use the safe async runner
-hostel_name = help.run_async(serv.get_hostel_name(st.session_state.hostel_id))
-with st.sidebar:
-    st.markdown("### Hostel Information")
-    st.markdown(f"**Hostel:** {hostel_name}")
-    st.markdown(f"**User:** `{st.session_state.user_id}`")
-    st.divider()
-    if st.button("Logout", use_container_width=True):
-        for key in list(st.session_state.keys()):
-            del st.session_state[key]
-        st.switch_page("app.py")
-
-def analytics_tab(hostel_id):
-    st.header("Live Meal Count for Tomorrow")
-    live_counts = help.run_async(serv.get_live_meal_counts(hostel_id))
+@st.fragment(run_every=serv.LIVE_COUNTS_POLL_SECONDS)
+def live_counts_panel(hostel_id):
+    # Each tick reads only tomorrow's event version; counts and recent changes are re-read when it moves.
+    next_day = (datetime.now() + timedelta(days=1)).date()
+    live_counts = st.session_state.live_counts
+    # A full page run has just read the counts in its snapshot, so only fragment reruns poll.
+    fresh = st.session_state.pop("live_counts_fresh", False)
+    if not fresh and (st.session_state.live_counts_day != next_day or run_async(serv.get_meal_event_version(hostel_id, next_day)) != live_counts['version']):
+        live_counts = st.session_state.live_counts = run_async(serv.get_live_meal_counts(hostel_id))
+        st.session_state.live_counts_day = next_day
+        st.session_state.recent_meal_events = None
     with st.container(border=True):
         col1, col2, col3, col4 = st.columns(4)
         col1.metric("🍳 Live Breakfasts", live_counts['breakfast'])
         col2.metric("🥗 Live Lunches", live_counts['lunch'])
         col3.metric("🍲 Live Dinners", live_counts['dinner'])
         col4.metric("👥 Responses So Far", f"{live_counts['responded']}/{live_counts['total']}")
-        if st.button("Refresh Counts"): st.rerun()
+        st.caption(f"Updates automatically every {serv.LIVE_COUNTS_POLL_SECONDS:g} seconds.")
+        if st.toggle("Show recent changes", key="show_meal_events"):
+            if st.session_state.get("recent_meal_events") is None:
+                st.session_state.recent_meal_events = run_async(serv.get_meal_events(hostel_id, next_day, limit=20))
+            events = st.session_state.recent_meal_events
+            if events:
+                st.dataframe(pd.DataFrame(events[::-1]), use_container_width=True, hide_index=True)
+            else:
+                st.info("No changes for tomorrow yet.")
+
+def analytics_tab(hostel_id, snapshot):
+    st.header("Live Meal Count for Tomorrow")
+    # The fragment starts from the snapshot and keeps it current between page runs.
+    st.session_state.live_counts = live_counts = snapshot['live_counts']
+    st.session_state.live_counts_day = (datetime.now() + timedelta(days=1)).date()
+    st.session_state.recent_meal_events = None
+    st.session_state.live_counts_fresh = True
+    live_counts_panel(hostel_id)
+    with st.container(border=True):
+        st.markdown("**Forecast Headcount** (based on each student's history; 95% range)")
+        meal_forecast = snapshot['forecast']
+        col1, col2, col3 = st.columns(3)
+        for col, (label, meal) in zip((col1, col2, col3), [("🍳 Breakfasts", "breakfast"), ("🥗 Lunches", "lunch"), ("🍲 Dinners", "dinner")]):
+            predicted = meal_forecast[meal]
+            col.metric(f"{label} Expected", predicted['expected'], delta=predicted['expected'] - live_counts[meal], delta_color="off",
+                       help=f"Likely between {predicted['low']} and {predicted['high']}. The delta compares with the live count, which assumes non-responders eat every meal.")
     st.header("Final Daily Report")
-    if datetime.now().time() > time(18, 0):
+    if datetime.now().time() > serv.CUTOFF_TIME:
         if st.button("Generate Final Report & Meal Passes", type="primary"):
             with st.spinner("Generating..."):
-                message = help.run_async(serv.generate_daily_report_and_passes(hostel_id))
+                message = run_async(serv.generate_daily_report_and_passes(hostel_id))
                 st.success(message)
     else:
-        st.info("Final report generation is available after 6:00 PM.", icon="🕒")
+        st.info(f"Final report generation is available after {serv.CUTOFF_TIME.strftime('%I:%M %p').lstrip('0')}. If the scheduler is running it is generated automatically.", icon="🕒")
+
+def history_tab(hostel_id):
+    st.header("Meal History")
+    col1, col2 = st.columns(2)
+    period_label = col1.selectbox("Group By", ["Week", "Month", "Day"])
+    limit = col2.slider("Periods to Show", min_value=4, max_value=104, value=26)
+    history_df = run_async(serv.get_meal_history(hostel_id, period_label.lower(), limit))
+    if history_df.empty:
+        st.info("No history yet. Rollups appear once final reports have been generated for past days.")
+        return
+    chart_df = history_df.set_index('period_start')
+    with st.container(border=True):
+        st.subheader("Opt-in Rate by Meal")
+        st.line_chart(chart_df[['breakfast_opt_in_rate', 'lunch_opt_in_rate', 'dinner_opt_in_rate']].rename(columns=lambda c: c.split('_')[0].title()))
+    with st.container(border=True):
+        st.subheader("Attendance Rate (of Opted-in)")
+        st.line_chart(chart_df[['breakfast_attendance_rate', 'lunch_attendance_rate', 'dinner_attendance_rate']].rename(columns=lambda c: c.split('_')[0].title()))
+    with st.container(border=True):
+        st.subheader("Response Rate")
+        st.line_chart(chart_df[['response_rate']].rename(columns={'response_rate': 'Responded'}))
+    with st.container(border=True):
+        st.subheader("Student Record")
+        col1, col2 = st.columns(2)
+        student_id = col1.text_input("Student ID", key="history_student_id")
+        months = col2.slider("Months", min_value=1, max_value=24, value=12)
+        if student_id:
+            end_date = datetime.now().date()
+            record_df = run_async(serv.get_student_history(hostel_id, student_id, end_date - timedelta(days=months * 31), end_date))
+            if record_df.empty:
+                st.info(f"No responses from {student_id.upper()} in that period.")
+            else:
+                record_df['month'] = record_df['month'].dt.strftime('%b %Y')
+                st.dataframe(record_df.iloc[::-1], use_container_width=True, hide_index=True)
 
 def user_management_tab(hostel_id, current_admin_id):
     st.header("Manage Users")
@@ -100,7 +105,7 @@ def user_management_tab(hostel_id, current_admin_id):
                 new_user_id = st.text_input("New Student User ID")
                 new_password = st.text_input("New Student Password", type="password")
                 if st.form_submit_button("Add Student", use_container_width=True, type="primary"):
-                    if help.run_async(serv.add_user(hostel_id, new_user_id, new_password, 'student', current_admin_id)):
+                    if run_async(serv.add_user(hostel_id, new_user_id, new_password, 'student', current_admin_id)):
                         st.success(f"Student '{new_user_id}' added.")
                     else:
                         st.error(f"Student '{new_user_id}' already exists.")
@@ -110,10 +115,29 @@ def user_management_tab(hostel_id, current_admin_id):
                 new_admin_id = st.text_input("New Admin User ID")
                 admin_password = st.text_input("New Admin Password", type="password")
                 if st.form_submit_button("Add Admin", use_container_width=True, type="primary"):
-                    if help.run_async(serv.add_user(hostel_id, new_admin_id, admin_password, 'admin', current_admin_id)):
+                    if run_async(serv.add_user(hostel_id, new_admin_id, admin_password, 'admin', current_admin_id)):
                         st.success(f"Admin '{new_admin_id}' added.")
                     else:
                         st.error(f"Admin '{new_admin_id}' already exists.")
+        with st.container(border=True):
+            st.subheader("Import Students from CSV")
+            st.caption("Upload a CSV with `user_id` and `password` columns.")
+            with st.form("import_students_form", clear_on_submit=True):
+                roster_file = st.file_uploader("Student Roster", type="csv")
+                if st.form_submit_button("Import Students", use_container_width=True, type="primary"):
+                    if roster_file is None:
+                        st.warning("Please choose a CSV file to import.")
+                    else:
+                        roster_df = pd.read_csv(roster_file, dtype=str, keep_default_na=False)
+                        if not {'user_id', 'password'}.issubset(roster_df.columns):
+                            st.error("The CSV must have `user_id` and `password` columns.")
+                        else:
+                            with st.spinner(f"Importing {len(roster_df)} students..."):
+                                report = run_async(serv.import_students(hostel_id, roster_df[['user_id', 'password']].itertuples(index=False), current_admin_id))
+                            report_df = pd.DataFrame(report)
+                            added = int((report_df['status'] == 'Added').sum()) if not report_df.empty else 0
+                            st.success(f"Added {added} of {len(report_df)} students.")
+                            st.dataframe(report_df, use_container_width=True, hide_index=True)
     with col2:
         with st.container(border=True):
             st.subheader("Change a User's Password")
@@ -124,7 +148,7 @@ def user_management_tab(hostel_id, current_admin_id):
                     if not user_to_change or not new_password:
                         st.warning("Please provide both a User ID and a new password.")
                     else:
-                        if help.run_async(serv.change_password(hostel_id, user_to_change, new_password)):
+                        if run_async(serv.change_password(hostel_id, user_to_change, new_password)):
                             st.success(f"Password for '{user_to_change}' has been updated.")
                         else:
                             st.error(f"User '{user_to_change}' not found.")
@@ -139,61 +163,280 @@ def user_management_tab(hostel_id, current_admin_id):
                     elif user_to_remove.upper() == current_admin_id.upper():
                         st.error("You cannot remove yourself.")
                     else:
-                        if help.run_async(serv.remove_user(hostel_id, user_to_remove)):
+                        if run_async(serv.remove_user(hostel_id, user_to_remove)):
                             st.success(f"User '{user_to_remove}' has been removed.")
                         else:
                             st.error(f"User '{user_to_remove}' not found.")
 
 def verification_tab(hostel_id):
     st.header("Meal Pass Verification")
-    st.info("Mess staff can select a meal and enter the 3-digit pass code to verify.", icon="🎟️")
+    st.info("Mess staff can select a meal and scan the pass QR code, or type the code shown after the first dash.", icon="🎟️")
     meal_choice = st.selectbox("Select a Meal to Verify", ["Breakfast", "Lunch", "Dinner"])
+    counter_mode = st.toggle("Counter mode", help="Checks each pass's signature locally and records attendance in the background, so verification keeps working through network blips.")
+    if counter_mode:
+        stats = serv.get_attendance_stats()
+        col1, col2 = st.columns([3, 1])
+        col1.caption(f"{stats['accepted']} accepted, {stats['rejected']} rejected, {stats['pending']} waiting to be saved.")
+        if col2.button("Save Now", use_container_width=True, disabled=not stats['pending']):
+            run_async(serv.flush_attendance())
+            st.rerun()
     with st.container(border=True):
         st.subheader(f"Verify for: {meal_choice}")
-        with st.form(f"{meal_choice}_verify_form"):
-            pass_suffix = st.text_input("Enter 3-digit Pass Code", max_chars=3, key=f"{meal_choice}_pass")
+        with st.form(f"{meal_choice}_verify_form", clear_on_submit=counter_mode):
+            pass_suffix = st.text_input("Enter Pass Code", max_chars=40, key=f"{meal_choice}_pass")
             if st.form_submit_button("Verify Pass", use_container_width=True):
                 if not pass_suffix:
                     st.warning("Pass code cannot be empty.")
                 else:
-                    msg, student = help.run_async(serv.verify_meal_pass(hostel_id, meal_choice, pass_suffix))
+                    if counter_mode:
+                        _, msg, student = run_async(serv.verify_pass_locally(hostel_id, meal_choice, pass_suffix))
+                    else:
+                        msg, student = run_async(serv.verify_meal_pass(hostel_id, meal_choice, pass_suffix))
                     st.success(msg) if student else st.error(msg)
+    with st.container(border=True):
+        st.subheader("Verify a Batch of Passes")
+        with st.form(f"{meal_choice}_batch_verify_form", clear_on_submit=True):
+            codes_text = st.text_area("Scanned Pass Codes (one per line)")
+            if st.form_submit_button("Verify All", use_container_width=True):
+                codes = codes_text.split()
+                if not codes:
+                    st.warning("Please enter at least one pass code.")
+                else:
+                    if counter_mode:
+                        results = [run_async(serv.verify_pass_locally(hostel_id, meal_choice, code)) for code in codes]
+                    else:
+                        results = run_async(serv.verify_meal_passes(hostel_id, meal_choice, codes))
+                    results_df = pd.DataFrame(results, columns=["Pass", "Result", "Student"])
+                    st.dataframe(results_df, use_container_width=True, hide_index=True)
+
+def bills_query():
+    """
+    The Expense History filters and page cursor, read from the widgets' state
+    so the page snapshot can fetch them before the widgets are drawn. New
+    filters start again from the first page.
+    """
+    today = datetime.now().date()
+    date_range = st.session_state.get("bills_date_range", (today.replace(day=1) - timedelta(days=365), today))
+    start_date, end_date = (tuple(date_range) + (None,))[:2] if isinstance(date_range, (tuple, list)) else (date_range, None)
+    filters = (start_date, end_date, st.session_state.get("bills_item_query", ""))
+    if st.session_state.get("bills_filters") != filters:
+        st.session_state.bills_filters = filters
+        st.session_state.bills_cursors = [None]
+    return filters, st.session_state.bills_cursors[-1]
 
-def bills_tab(hostel_id):
+def bills_tab(hostel_id, snapshot):
     st.header("Bills & Expenses")
     st.info("Keep a record of all mess-related expenses.", icon="💰")
-    with st.container(border=True):
+    col1, col2 = st.columns(2)
+    with col1, st.container(border=True):
         st.subheader("Add New Bill")
         with st.form("add_bill_form", clear_on_submit=True):
             item_name = st.text_input("Item/Service Description")
             price = st.number_input("Price (₹)", min_value=0.0, format="%.2f")
             if st.form_submit_button("Add Bill", use_container_width=True, type="primary"):
                 if item_name and price > 0:
-                    help.run_async(serv.add_bill(hostel_id, item_name, price))
+                    run_async(serv.add_bill(hostel_id, item_name, price))
+                    snapshot = None
                     st.success("Bill added successfully!")
                 else:
                     st.warning("Please provide both an item name and a valid price.")
+    with col2, st.container(border=True):
+        st.subheader("Import Bills from CSV")
+        st.caption("Columns: `item_name`, `price` and optionally `purchase_date` (YYYY-MM-DD).")
+        with st.form("import_bills_form", clear_on_submit=True):
+            bills_file = st.file_uploader("Bills File", type="csv")
+            if st.form_submit_button("Import Bills", use_container_width=True, type="primary"):
+                if bills_file is None:
+                    st.warning("Please choose a CSV file to import.")
+                else:
+                    upload_df = pd.read_csv(bills_file, dtype=str, keep_default_na=False)
+                    if not {'item_name', 'price'}.issubset(upload_df.columns):
+                        st.error("The CSV must have `item_name` and `price` columns.")
+                    else:
+                        raw_dates = upload_df.get('purchase_date', pd.Series('', index=upload_df.index)).str.strip()
+                        dates = pd.to_datetime(raw_dates.where(raw_dates != ''), format='%Y-%m-%d', errors='coerce')
+                        prices = pd.to_numeric(upload_df['price'], errors='coerce')
+                        valid = (upload_df['item_name'].str.strip() != '') & (prices > 0) & (dates.notna() | (raw_dates == ''))
+                        bills = [
+                            (item_name, float(price), None if pd.isna(day) else day.strftime('%Y-%m-%d'))
+                            for item_name, price, day in zip(upload_df.loc[valid, 'item_name'].str.strip(), prices[valid], dates[valid])
+                        ]
+                        added = run_async(serv.add_bills(hostel_id, bills))
+                        snapshot = None
+                        st.success(f"Imported {added} bills.")
+                        if (~valid).any():
+                            st.warning(f"Skipped {int((~valid).sum())} rows with a missing item, invalid price or invalid date.")
+
     with st.container(border=True):
         st.subheader("Expense History")
-        bills_df = help.run_async(serv.get_bills(hostel_id))
-        if not bills_df.empty:
-            bills_df['purchase_date'] = pd.to_datetime(bills_df['purchase_date']).dt.strftime('%d %B %Y')
-            st.dataframe(bills_df, use_container_width=True, hide_index=True)
+        col1, col2 = st.columns(2)
+        today = datetime.now().date()
+        col1.date_input("Date Range", value=(today.replace(day=1) - timedelta(days=365), today), key="bills_date_range")
+        col2.text_input("Item Contains", key="bills_item_query")
+        filters, after = bills_query()
+        # The snapshot already read this page unless a bill was added above or the filters just changed.
+        if snapshot and (snapshot['bills']['filters'], snapshot['bills']['after']) == (filters, after):
+            totals, (page_df, next_cursor) = snapshot['bills']['totals'], snapshot['bills']['page']
         else:
-            st.info("No bills have been recorded yet.")
+            totals = run_async(serv.get_bill_totals(hostel_id, *filters))
+            page_df, next_cursor = run_async(serv.get_bills_page(hostel_id, *filters, after=after))
+        if not totals['bills']:
+            st.info("No bills have been recorded for these filters.")
+            return
+        sum_col1, sum_col2 = st.columns(2)
+        sum_col1.metric("Total Spent", f"₹{totals['total']:,.2f}")
+        sum_col2.metric("Bills", totals['bills'])
+        chart_col, items_col = st.columns(2)
+        chart_col.bar_chart(totals['monthly'].set_index('month')['total'])
+        items_col.dataframe(totals['items'].head(10), use_container_width=True, hide_index=True)
+
+        cursors = st.session_state.bills_cursors
+        page_df['purchase_date'] = pd.to_datetime(page_df['purchase_date']).dt.strftime('%d %B %Y')
+        st.dataframe(page_df, use_container_width=True, hide_index=True)
+        nav_col1, nav_col2, nav_col3 = st.columns([1, 2, 1])
+        if nav_col1.button("← Previous", disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+        nav_col2.caption(f"Page {len(cursors)}")
+        if nav_col3.button("Next →", disabled=next_cursor is None, use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
+
+def exports_tab(hostel_id):
+    st.header("Export Data")
+    st.info("Exports are streamed from the database when you click download, so long date ranges stay cheap.", icon="📦")
+    datasets = {"Meal Responses": "responses", "Attendance": "attendance", "Bills": "bills"}
+    formats = {"Compressed CSV (.csv.gz)": "csv.gz", "CSV": "csv", "Parquet": "parquet"}
+    col1, col2, col3 = st.columns(3)
+    dataset = datasets[col1.selectbox("Dataset", list(datasets))]
+    fmt = formats[col2.selectbox("Format", list(formats))]
+    today = datetime.now().date()
+    date_range = col3.date_input("Date Range", value=(today - timedelta(days=180), today), key="export_date_range")
+    if not isinstance(date_range, tuple) or len(date_range) != 2:
+        st.warning("Please choose a start and end date.")
+        return
+    start_date, end_date = date_range
+
+    def build_export():
+        # Chunks spill to a temporary file, which is handed over as the download instead of being read back here.
+        # The reader holds its own descriptor, so the unlinked file lives until Streamlit has read and dropped it.
+        with tempfile.TemporaryFile() as out:
+            run_async(serv.write_export(hostel_id, dataset, start_date, end_date, fmt, out))
+            out.flush()
+            return open(os.dup(out.fileno()), "rb")
+
+    mime, extension = FORMATS[fmt]
+    st.download_button(
+        "Download Export", build_export, file_name=f"{hostel_id}_{dataset}_{start_date}_{end_date}.{extension}",
+        mime=mime, on_click="ignore", type="primary", use_container_width=True
+    )
+
+def diagnostics_tab(hostel_id):
+    st.header("Diagnostics")
+    with st.container(border=True):
+        st.subheader("Password Worker Pool")
+        pool_stats = help.get_password_pool_stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Workers", pool_stats['workers'])
+        col2.metric("In Flight (Peak)", f"{pool_stats['in_flight']} ({pool_stats['peak_in_flight']})")
+        col3.metric("Completed", pool_stats['completed'])
+        col4.metric("Avg / Max Latency", f"{pool_stats['avg_seconds'] * 1000:.0f} / {pool_stats['max_seconds'] * 1000:.0f} ms")
+    with st.container(border=True):
+        st.subheader("Login Throttling")
+        throttle_stats = serv.get_login_throttle_stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Attempts Allowed", throttle_stats['allowed'])
+        col2.metric("Rejected (Blocked)", f"{throttle_stats['throttled'] + throttle_stats['blocked']} ({throttle_stats['blocked']})")
+        col3.metric("Users Blocked Now", throttle_stats['blocked_users'])
+        col4.metric("Sync Failures", throttle_stats['sync_failures'])
+        report = run_async(serv.get_login_throttle_report(hostel_id))
+        if report:
+            report_df = pd.DataFrame(report)
+            report_df['user_id'] = report_df['user_id'].replace('', '(whole hostel)')
+            report_df['blocked_until'] = report_df['blocked_until'].where(report_df['blocked_until'] > datetime.now().timestamp())
+            for column in ('blocked_until', 'updated_at'):
+                report_df[column] = pd.to_datetime(report_df[column], unit='s').dt.strftime('%H:%M:%S')
+            st.dataframe(report_df, use_container_width=True, hide_index=True)
+        else:
+            st.caption("No rejected or failed logins for this hostel.")
+    if not metrics.ENABLED:
+        st.info("Query instrumentation is off. Set `DB_METRICS = true` in your secrets to record per-query timings.", icon="🩺")
+        return
+    data = metrics.snapshot()
+    renders = [r for r in data['renders'] if r['page'] == 'admin_dashboard']
+    with st.container(border=True):
+        st.subheader("Page Renders")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Connections Acquired", data['connections']['count'])
+        col2.metric("Avg Connection Setup", f"{data['connections']['seconds'] / data['connections']['count'] * 1000 if data['connections']['count'] else 0:.1f} ms")
+        col3.metric("Avg Round Trips / Admin Render", f"{sum(r['round_trips'] for r in renders) / len(renders):.1f}" if renders else "–")
+        if data['renders']:
+            renders_df = pd.DataFrame(data['renders'])
+            renders_df['started_at'] = pd.to_datetime(renders_df['started_at'], unit='s').dt.strftime('%H:%M:%S')
+            renders_df['db_ms'] = (renders_df.pop('db_seconds') * 1000).round(1)
+            st.dataframe(renders_df.iloc[::-1], use_container_width=True, hide_index=True)
+    with st.container(border=True):
+        st.subheader("Queries by Total Time")
+        if data['queries']:
+            queries_df = pd.DataFrame([{"sql": sql, "calls": q['count'], "total_ms": q['seconds'] * 1000, "avg_ms": q['seconds'] / q['count'] * 1000, "max_ms": q['max_seconds'] * 1000, "rows": q['rows']} for sql, q in data['queries'].items()])
+            st.dataframe(queries_df.sort_values("total_ms", ascending=False).round(2), use_container_width=True, hide_index=True)
+        else:
+            st.info("No queries recorded yet.")
+    with st.container(border=True):
+        st.subheader("Service Calls")
+        if data['services']:
+            services_df = pd.DataFrame([{"service": name, "calls": c['count'], "avg_ms": c['seconds'] / c['count'] * 1000, "max_ms": c['max_seconds'] * 1000} for name, c in data['services'].items()])
+            st.dataframe(services_df.sort_values("avg_ms", ascending=False).round(2), use_container_width=True, hide_index=True)
+    col1, col2 = st.columns(2)
+    col1.download_button("Download Metrics (text)", metrics.export_text(), file_name="hostel_metrics.txt", mime="text/plain", use_container_width=True)
+    if col2.button("Reset Metrics", use_container_width=True):
+        metrics.reset()
+        st.rerun()
 
 # --- Main Admin Dashboard ---
-hostel_id = st.session_state.hostel_id
-current_admin_id = st.session_state.user_id
-summary = help.run_async(serv.get_hostel_summary(hostel_id))
-st.title(f"⚙️ Admin Dashboard: {summary['name']}")
-sum_col1, sum_col2, sum_col3 = st.columns(3)
-sum_col1.metric("Hostel Name", summary['name'])
-sum_col2.metric("Hostel ID", summary['id'])
-sum_col3.metric("Total Students", summary['student_count'])
-
-tab1, tab2, tab3, tab4 = st.tabs(["📊 Analytics", "👤 User Management", "🎟️ Meal Verification", "💰 Bills & Expenses"])
-with tab1: analytics_tab(hostel_id)
-with tab2: user_management_tab(hostel_id, current_admin_id)
-with tab3: verification_tab(hostel_id)
-with tab4: bills_tab(hostel_id)
\ No newline at end of file
+def main():
+    session = sessions.read_session_token(st.session_state.get("session_token"))
+    if not st.session_state.get("logged_in") or not session or session["role"] != 'admin':
+        st.error("You must be an admin to access this page.")
+        st.page_link("app.py", label="Go to Login", icon="🏠")
+        st.stop()
+
+    # Everything the default tab and the bills list show comes from one batched round trip.
+    bill_filters, bills_after = bills_query()
+    snapshot = run_async(serv.get_admin_dashboard_snapshot(st.session_state.hostel_id, bill_filters, bills_after))
+    with st.sidebar:
+        st.markdown("### Hostel Information")
+        st.markdown(f"**Hostel:** {snapshot['name']}")
+        st.markdown(f"**User:** `{st.session_state.user_id}`")
+        st.divider()
+        if st.button("Logout", use_container_width=True):
+            for key in list(st.session_state.keys()):
+                del st.session_state[key]
+            st.switch_page("app.py")
+
+    hostel_id = st.session_state.hostel_id
+    current_admin_id = st.session_state.user_id
+    st.title(f"⚙️ Admin Dashboard: {snapshot['name']}")
+    sum_col1, sum_col2, sum_col3 = st.columns(3)
+    sum_col1.metric("Hostel Name", snapshot['name'])
+    sum_col2.metric("Hostel ID", snapshot['id'])
+    sum_col3.metric("Total Students", snapshot['student_count'])
+
+    # Only the open tab runs, so History and Diagnostics query nothing until they are opened.
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["📊 Analytics", "📈 History", "👤 User Management", "🎟️ Meal Verification", "💰 Bills & Expenses", "📦 Exports", "🩺 Diagnostics"], key="admin_tab", on_change="rerun")
+    if tab1.open:
+        with tab1: analytics_tab(hostel_id, snapshot)
+    if tab2.open:
+        with tab2: history_tab(hostel_id)
+    if tab3.open:
+        with tab3: user_management_tab(hostel_id, current_admin_id)
+    if tab4.open:
+        with tab4: verification_tab(hostel_id)
+    if tab5.open:
+        with tab5: bills_tab(hostel_id, snapshot)
+    if tab6.open:
+        with tab6: exports_tab(hostel_id)
+    if tab7.open:
+        with tab7: diagnostics_tab(hostel_id)
+
+bootstrap_page("admin_dashboard", "Admin Dashboard", "⚙️", main)
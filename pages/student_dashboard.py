@@ -1,121 +1,116 @@
 import streamlit as st
-from datetime import datetime, time, timedelta
+from datetime import datetime, timedelta
 from core import services as serv
+from core import sessions
 import pandas as pd
-from utils import helpers as help
+import io
+from utils.bootstrap import bootstrap_page, run_async
 
-st.set_page_config(page_title="Student Dashboard", page_icon="🎓", layout="wide")
+WEEKDAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
 
-def load_css():
-    st.markdown("""
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap');
-            @import url('https://fonts.googleapis.com/icon?family=Material+Icons');
-            html, body, [class*="st-"], [class*="css-"] {
-                font-family: 'Inter', sans-serif;
-            }
-            
-            /* Fix for icon rendering issues */
-            .stButton > button {
-                font-family: 'Inter', sans-serif;
-            }
-            
-            /* Ensure emoji icons render properly */
-            .stMarkdown {
-                font-family: 'Inter', sans-serif;
-            }
-            
-            /* Sidebar styling */
-            .css-1d391kg {
-                font-family: 'Inter', sans-serif;
-            }
-            
-            /* Fix Material Icons in sidebar */
-            .material-icons {
-                font-family: 'Material Icons';
-                font-weight: normal;
-                font-style: normal;
-                font-size: 24px;
-                line-height: 1;
-                letter-spacing: normal;
-                text-transform: none;
-                display: inline-block;
-                white-space: nowrap;
-                word-wrap: normal;
-                direction: ltr;
-                -webkit-font-feature-settings: 'liga';
-                -webkit-font-smoothing: antialiased;
-            }
-            
-            /* Override any broken icon display */
-            [class*="css-"] .material-icons {
-                font-family: 'Material Icons' !important;
-            }
-        </style>
-    """, unsafe_allow_html=True)
+def pass_qr_png(code):
+    # Passes exist only after the cutoff, so segno is imported then, not on every cold start.
+    import segno
+    buffer = io.BytesIO()
+    segno.make(code, error="m").save(buffer, kind="png", scale=6, border=2)
+    return buffer.getvalue()
 
-load_css()
+def main():
+    if not st.session_state.get("logged_in") or not sessions.read_session_token(st.session_state.get("session_token")):
+        st.error("Please log in to access this page.")
+        st.page_link("app.py", label="Go to Login", icon="🏠")
+        st.stop()
 
-if not st.session_state.get("logged_in"):
-    st.error("Please log in to access this page.")
-    st.page_link("app.py", label="Go to Login", icon="🏠")
-    st.stop()
+    # The hostel name, tomorrow's choices and preferences come from one batched round trip.
+    snapshot = run_async(serv.get_student_dashboard_snapshot(st.session_state.hostel_id, st.session_state.user_id))
+    with st.sidebar:
+        st.markdown("### Hostel Information")
+        st.markdown(f"**Hostel:** {snapshot['hostel_name']}")
+        st.markdown(f"**User:** `{st.session_state.user_id}`")
+        st.divider()
+        if st.button("Logout", use_container_width=True):
+            for key in list(st.session_state.keys()):
+                del st.session_state[key]
+            st.switch_page("app.py")
 
-# Use the safe async runner
-hostel_name = help.run_async(serv.get_hostel_name(st.session_state.hostel_id))
-with st.sidebar:
-    st.markdown("### Hostel Information")
-    st.markdown(f"**Hostel:** {hostel_name}")
-    st.markdown(f"**User:** `{st.session_state.user_id}`")
-    st.divider()
-    if st.button("Logout", use_container_width=True):
-        for key in list(st.session_state.keys()):
-            del st.session_state[key]
-        st.switch_page("app.py")
+    st.title(f"🎓 Welcome, {st.session_state['user_id']}!")
 
-st.title(f"🎓 Welcome, {st.session_state['user_id']}!")
+    now = datetime.now()
+    next_day_str = (now + timedelta(days=1)).strftime("%A, %B %d")
 
-CUTOFF_TIME = time(18, 0)
-now = datetime.now()
-next_day_str = (now + timedelta(days=1)).strftime("%A, %B %d")
+    st.info(f"Meal choices for **{next_day_str}** are managed below.", icon="🕒")
 
-st.info(f"Meal choices for **{next_day_str}** are managed below.", icon="🕒")
-
-with st.container(border=True):
-    if now.time() < CUTOFF_TIME:
-        st.write("#### Update Your Meal Choices for Tomorrow")
-        with st.form("meal_form"):
-            cols = st.columns(3)
-            b = cols[0].checkbox("🍳 Breakfast", value=True)
-            l = cols[1].checkbox("🥗 Lunch", value=True)
-            d = cols[2].checkbox("🍲 Dinner", value=True)
-            if st.form_submit_button("Confirm My Choices", use_container_width=True, type="primary"):
-                help.run_async(serv.submit_meal_response(st.session_state.hostel_id, st.session_state.user_id, b, l, d))
-                st.toast("Your choices have been saved!", icon="✅")
-    else:
-        st.write("#### Your Meal Passes for Tomorrow")
-        st.warning("The selection deadline has passed. Show these passes at the mess.", icon="🎟️")
-        
-        meal_info = help.run_async(serv.get_student_meal_info(st.session_state.hostel_id, st.session_state.user_id))
-        if meal_info:
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.subheader("🍳 Breakfast")
-                if meal_info['breakfast']:
-                    st.code(meal_info['breakfast_pass'], language=None)
-                else:
-                    st.info("Not Attending")
-            with col2:
-                st.subheader("🥗 Lunch")
-                if meal_info['lunch']:
-                    st.code(meal_info['lunch_pass'], language=None)
-                else:
-                    st.info("Not Attending")
-            with col3:
-                st.subheader("🍲 Dinner")
-                if meal_info['dinner']:
-                    st.code(meal_info['dinner_pass'], language=None)
-                else:
-                    st.info("Not Attending")
+    with st.container(border=True):
+        if now.time() < serv.CUTOFF_TIME:
+            st.write("#### Update Your Meal Choices for Tomorrow")
+            meal_info = snapshot['meal_info']
+            if meal_info:
+                current = (bool(meal_info['breakfast']), bool(meal_info['lunch']), bool(meal_info['dinner']))
+            else:
+                current = snapshot['preferences'].get((now + timedelta(days=1)).isoweekday() % 7, (True, True, True))
+            with st.form("meal_form"):
+                cols = st.columns(3)
+                b = cols[0].checkbox("🍳 Breakfast", value=current[0])
+                l = cols[1].checkbox("🥗 Lunch", value=current[1])
+                d = cols[2].checkbox("🍲 Dinner", value=current[2])
+                if st.form_submit_button("Confirm My Choices", use_container_width=True, type="primary"):
+                    run_async(serv.submit_meal_response(st.session_state.hostel_id, st.session_state.user_id, b, l, d))
+                    st.toast("Your choices have been saved!", icon="✅")
         else:
-            st.info("You did not make a selection for tomorrow. It is assumed you are attending all meals, but no passes were generated. Please contact your admin.")
\ No newline at end of file
+            st.write("#### Your Meal Passes for Tomorrow")
+            st.warning("The selection deadline has passed. Show these passes at the mess.", icon="🎟️")
+        
+            meal_info = snapshot['meal_info']
+            if meal_info:
+                for col, (label, meal) in zip(st.columns(3), [("🍳 Breakfast", "breakfast"), ("🥗 Lunch", "lunch"), ("🍲 Dinner", "dinner")]):
+                    with col:
+                        st.subheader(label)
+                        if meal_info[meal] and meal_info[f'{meal}_pass']:
+                            st.code(meal_info[f'{meal}_pass'], language=None)
+                            st.image(pass_qr_png(meal_info[f'{meal}_pass']), width=180)
+                        elif meal_info[meal]:
+                            st.info("Your pass will appear once the final report is generated.")
+                        else:
+                            st.info("Not Attending")
+            else:
+                st.info("You did not make a selection for tomorrow. It is assumed you are attending all meals, but no passes were generated. Please contact your admin.")
+
+    with st.container(border=True):
+        st.write("#### Plan Ahead")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**Weekly Preferences**")
+            st.caption("Used on any day you don't respond to. Changes apply from the next report onwards.")
+            preferences = snapshot['preferences']
+            week_df = pd.DataFrame(
+                [(WEEKDAYS[day], *preferences.get(day, (True, True, True))) for day in [1, 2, 3, 4, 5, 6, 0]],
+                columns=["Day", "Breakfast", "Lunch", "Dinner"]
+            )
+            with st.form("preferences_form"):
+                edited_df = st.data_editor(week_df, disabled=["Day"], hide_index=True, use_container_width=True)
+                if st.form_submit_button("Save Preferences", use_container_width=True, type="primary"):
+                    # Only days that differ from the all-meals default are stored.
+                    new_preferences = {
+                        WEEKDAYS.index(row.Day): (bool(row.Breakfast), bool(row.Lunch), bool(row.Dinner))
+                        for row in edited_df.itertuples() if not (row.Breakfast and row.Lunch and row.Dinner)
+                    }
+                    run_async(serv.set_meal_preferences(st.session_state.hostel_id, st.session_state.user_id, new_preferences))
+                    st.toast("Your weekly preferences have been saved!", icon="✅")
+        with col2:
+            st.write("**Plan a Date Range**")
+            st.caption("Set the same choices for several days at once, e.g. while you are away.")
+            first_day = (now + timedelta(days=1 if now.time() < serv.CUTOFF_TIME else 2)).date()
+            with st.form("plan_form"):
+                plan_range = st.date_input("Dates", value=(first_day, first_day + timedelta(days=6)), min_value=first_day, max_value=first_day + timedelta(days=serv.MAX_PLAN_DAYS - 1))
+                cols = st.columns(3)
+                plan_b = cols[0].checkbox("🍳 Breakfast", value=False, key="plan_breakfast")
+                plan_l = cols[1].checkbox("🥗 Lunch", value=False, key="plan_lunch")
+                plan_d = cols[2].checkbox("🍲 Dinner", value=False, key="plan_dinner")
+                if st.form_submit_button("Apply to These Dates", use_container_width=True, type="primary"):
+                    if isinstance(plan_range, tuple) and len(plan_range) == 2:
+                        days = run_async(serv.submit_meal_plan(st.session_state.hostel_id, st.session_state.user_id, *plan_range, plan_b, plan_l, plan_d))
+                        st.toast(f"Your choices have been saved for {days} days!", icon="✅")
+                    else:
+                        st.warning("Please choose a start and end date.")
+
+bootstrap_page("student_dashboard", "Student Dashboard", "🎓", main)
@@ -0,0 +1,32 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from core.migrations import MIGRATIONS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each child starts its migrator on the same file at the same moment.
+_CHILD = """
+import sys, time
+from core import database, migrations
+from core.sqlite_backend import LocalBackend
+from utils import helpers as help
+path, start_at = sys.argv[1], float(sys.argv[2])
+database.use_backend(LocalBackend(path))
+time.sleep(max(0, start_at - time.time()))
+help.run_async(migrations.run_migrations())
+"""
+
+def test_concurrent_migrators_apply_each_version_once(tmp_path):
+    path = str(tmp_path / "race.db")
+    env = {**os.environ, "DB_BACKEND": "sqlite", "SQLITE_PATH": path, "PYTHONPATH": ROOT}
+    start_at = str(time.time() + 2)
+    children = [subprocess.Popen([sys.executable, "-c", _CHILD, path, start_at], cwd=ROOT, env=env, stderr=subprocess.PIPE, text=True) for _ in range(4)]
+    errors = [child.communicate(timeout=120)[1] for child in children]
+    assert [child.returncode for child in children] == [0] * len(children), errors
+
+    versions = [row[0] for row in sqlite3.connect(path).execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [version for version, _, _ in MIGRATIONS]
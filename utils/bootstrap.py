@@ -0,0 +1,87 @@
+import threading
+import streamlit as st
+from core import services as serv
+from core import metrics
+from core.database import HostelUnavailable
+from utils import helpers as help
+
+# Shared by app.py and every page; built once when the module is first imported.
+CSS = """
+<style>
+    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap');
+    @import url('https://fonts.googleapis.com/icon?family=Material+Icons');
+    html, body, [class*="st-"], [class*="css-"] { font-family: 'Inter', sans-serif; }
+    .st-emotion-cache-1y4p8pa { padding-top: 2rem; }
+
+    /* Fix for icon rendering issues */
+    .stButton > button { font-family: 'Inter', sans-serif; }
+
+    /* Ensure emoji icons render properly */
+    .stMarkdown { font-family: 'Inter', sans-serif; }
+
+    /* Sidebar styling */
+    .css-1d391kg { font-family: 'Inter', sans-serif; }
+
+    /* Fix Material Icons in sidebar */
+    .material-icons {
+        font-family: 'Material Icons';
+        font-weight: normal;
+        font-style: normal;
+        font-size: 24px;
+        line-height: 1;
+        letter-spacing: normal;
+        text-transform: none;
+        display: inline-block;
+        white-space: nowrap;
+        word-wrap: normal;
+        direction: ltr;
+        -webkit-font-feature-settings: 'liga';
+        -webkit-font-smoothing: antialiased;
+    }
+
+    /* Override any broken icon display */
+    [class*="css-"] .material-icons { font-family: 'Material Icons' !important; }
+</style>
+"""
+
+_database_ready = False
+_lock = threading.Lock()
+
+def ensure_database():
+    """
+    Runs migrations the first time any page renders in this process, so a page
+    opened directly works too. Later renders skip the trip to the event loop.
+    """
+    global _database_ready
+    if _database_ready:
+        return
+    with _lock:
+        if not _database_ready:
+            help.run_async(serv.setup_database())
+            _database_ready = True
+
+def bootstrap_page(name, page_title, page_icon, main, layout="wide", **page_config):
+    """
+    Runs one render of a page: page config, styles and the schema check, then
+    the page's `main`. The render's metrics are closed however the run ends,
+    including st.stop, st.rerun and st.switch_page.
+    """
+    st.set_page_config(page_title=page_title, page_icon=page_icon, layout=layout, **page_config)
+    metrics.start_render(name)
+    try:
+        st.markdown(CSS, unsafe_allow_html=True)
+        ensure_database()
+        main()
+    finally:
+        metrics.finish_render()
+
+def run_async(coro):
+    """
+    help.run_async for page code. While the hostel is being moved to another
+    shard, shows a warning and ends the run instead of a traceback.
+    """
+    try:
+        return help.run_async(coro)
+    except HostelUnavailable:
+        st.warning("Your hostel's data is being moved right now. Please try again shortly.", icon="⏳")
+        st.stop()
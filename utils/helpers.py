@@ -1,35 +1,123 @@
 import random
 import string
-import base64
-from passlib.context import CryptContext
+from core import metrics
 import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_pwd_context = None
+
+def get_pwd_context():
+    """The bcrypt context, built on first use so pages that never hash skip importing passlib."""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+# bcrypt releases the GIL, so a small thread pool runs hashes in parallel
+# while keeping the shared event loop free for database work.
+_password_pool = None
+_password_stats = {"in_flight": 0, "peak_in_flight": 0, "completed": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+
+def get_password_pool():
+    global _password_pool
+    if _password_pool is None:
+        _password_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="bcrypt")
+    return _password_pool
+
+async def _run_password_job(func, *args):
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    _password_stats["in_flight"] += 1
+    _password_stats["peak_in_flight"] = max(_password_stats["peak_in_flight"], _password_stats["in_flight"])
+    try:
+        return await loop.run_in_executor(get_password_pool(), func, *args)
+    finally:
+        elapsed = time.perf_counter() - started
+        _password_stats["in_flight"] -= 1
+        _password_stats["completed"] += 1
+        _password_stats["total_seconds"] += elapsed
+        _password_stats["max_seconds"] = max(_password_stats["max_seconds"], elapsed)
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_job(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+def get_password_pool_stats():
+    """Concurrency and latency (including queue wait) of offloaded hash jobs."""
+    stats = dict(_password_stats)
+    stats["workers"] = get_password_pool()._max_workers
+    stats["avg_seconds"] = stats["total_seconds"] / stats["completed"] if stats["completed"] else 0.0
+    return stats
+
+def hash_password_list(passwords):
+    return [hash_password(password) for password in passwords]
+
+_hash_pool = None
+
+def get_hash_pool():
+    """A process pool for bulk bcrypt hashing, sized to the machine's cores."""
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 2)
+    return _hash_pool
+
+async def hash_passwords(passwords, chunk_size=50):
+    """
+    Hashes many passwords across worker processes without blocking the event
+    loop. Results are returned in input order.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_hash_pool()
+    results = await asyncio.gather(*(loop.run_in_executor(pool, hash_password_list, chunk) for chunk in chunked(passwords, chunk_size)))
+    return [hashed for chunk in results for hashed in chunk]
 
 def generate_unique_hostel_id(hostel_name: str) -> str:
     prefix = ''.join(filter(str.isalnum, hostel_name))[:4].upper()
     suffix = ''.join(random.choices(string.digits, k=4))
     return f"{prefix}{suffix}"
 
-def df_to_csv_download_link(df, filename="data.csv", link_text="Download CSV"):
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    return f'<a href="data:file/csv;base64,{b64}" download="{filename}">{link_text}</a>'
+def chunked(items, size):
+    """Splits a sequence into consecutive lists of at most `size` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+def get_event_loop():
+    """
+    Returns the process-wide event loop, starting its background thread on first use.
+    """
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="async-runtime", daemon=True)
+            _loop_thread.start()
+    return _loop
 
 def run_async(coro):
     """
-    A helper function to safely run an async function from a sync context,
-    avoiding the "event loop is already running" error on Streamlit Cloud.
+    A helper function to safely run an async function from a sync context.
+    Coroutines are submitted to one shared background event loop, so every
+    Streamlit session reuses the same warm database clients and no loops leak.
     """
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    return loop.run_until_complete(coro)
\ No newline at end of file
+    loop = get_event_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_async cannot be called from the event loop thread; await the coroutine instead.")
+    if metrics.ENABLED:
+        coro = metrics.track_call(coro)
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()